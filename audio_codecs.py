@@ -0,0 +1,150 @@
+import json
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+from audio_split import run_ffmpeg, probe_duration
+
+# Codecs de sortie du best-of. Pour de la voix, Opus 24-32 kbps mono ou AAC-HE
+# donnent des fichiers 6-8x plus petits que MP3 VBR -q:a 2 (~190 kbps), et l'upload
+# JSON+base64 vers GAS ajoute +33% : la taille compte deux fois.
+
+CODECS: Dict[str, Dict[str, Any]] = {
+    # Historique: MP3 VBR haute qualité (~190 kbps)
+    "mp3":     {"ext": ".mp3",  "mime": "audio/mpeg", "format": "mp3",
+                "args": ["-c:a", "libmp3lame", "-q:a", "2"]},
+    "mp3-64":  {"ext": ".mp3",  "mime": "audio/mpeg", "format": "mp3",
+                "args": ["-c:a", "libmp3lame", "-b:a", "64k", "-ac", "1"]},
+    "opus-24": {"ext": ".opus", "mime": "audio/ogg",  "format": "ogg",
+                "args": ["-c:a", "libopus", "-b:a", "24k", "-ac", "1", "-application", "voip"]},
+    "opus-32": {"ext": ".opus", "mime": "audio/ogg",  "format": "ogg",
+                "args": ["-c:a", "libopus", "-b:a", "32k", "-ac", "1", "-application", "voip"]},
+    # AAC-HE nécessite un ffmpeg compilé avec libfdk_aac ; sinon utiliser "aac-48" (encodeur natif, AAC-LC)
+    "aac-he":  {"ext": ".m4a",  "mime": "audio/mp4",  "format": "mp4",
+                "args": ["-c:a", "libfdk_aac", "-profile:a", "aac_he", "-b:a", "32k", "-ac", "1"]},
+    "aac-48":  {"ext": ".m4a",  "mime": "audio/mp4",  "format": "mp4",
+                "args": ["-c:a", "aac", "-b:a", "48k", "-ac", "1"]},
+}
+
+def get_codec(name: str) -> Dict[str, Any]:
+    if name not in CODECS:
+        raise ValueError(f"Codec inconnu '{name}'. Choix: {', '.join(CODECS)}")
+    return CODECS[name]
+
+# =========================
+# Chapitres
+# =========================
+
+def build_chapters(clips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Index du best-of: pour chaque clip (dans l'ordre de montage), son offset dans le best-of
+    et sa provenance (fichier source, start/end dans ce fichier, label).
+    """
+    chapters = []
+    offset = 0.0
+    for c in clips:
+        dur = max(0.0, float(c["end"]) - float(c["start"]))
+        chapters.append({
+            "offset": round(offset, 3),
+            "duration": round(dur, 3),
+            "file": Path(c["file"]).name if c.get("file") else "",
+            "start": round(float(c.get("src_start", c["start"])), 3),
+            "end": round(float(c.get("src_end", c["end"])), 3),
+            "label": c.get("label", ""),
+            "score": c.get("score", 0.0),
+        })
+        offset += dur
+    return chapters
+
+def locate_in_sources(clips: List[Dict[str, Any]], file_map: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Ajoute à chaque clip (timeline concaténée) son fichier source et ses timestamps dans ce fichier
+    ("file", "src_start", "src_end") à partir du file_map de unzip_and_concat.
+    """
+    out = []
+    for c in clips:
+        src = next((m for m in file_map if m["start"] <= c["start"] < m["end"]), None)
+        if src is None:
+            out.append(dict(c))
+            continue
+        out.append({**c, "file": src["file"],
+                    "src_start": c["start"] - src["start"], "src_end": min(c["end"], src["end"]) - src["start"]})
+    return out
+
+def _ffmeta_escape(s: str) -> str:
+    for ch in ("\\", "=", ";", "#", "\n"):
+        s = s.replace(ch, "\\" + ch)
+    return s
+
+def write_ffmetadata(chapters: List[Dict[str, Any]], path: Path) -> Path:
+    """Fichier FFMETADATA1 pour embarquer les chapitres dans le conteneur (ID3 CHAP, Ogg, MP4)."""
+    lines = [";FFMETADATA1"]
+    for ch in chapters:
+        start_ms = int(round(ch["offset"] * 1000))
+        end_ms = int(round((ch["offset"] + ch["duration"]) * 1000))
+        title = ch["label"] or f"{ch['file']} @ {ch['start']:.1f}s"
+        lines += ["[CHAPTER]", "TIMEBASE=1/1000", f"START={start_ms}", f"END={end_ms}",
+                  f"title={_ffmeta_escape(title)}"]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+def write_chapters_sidecar(chapters: List[Dict[str, Any]], audio_path: str, codec: str, sidecar_path: str) -> None:
+    with open(sidecar_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "audio": Path(audio_path).name,
+            "codec": codec,
+            "mimeType": get_codec(codec)["mime"],
+            "chapters": chapters,
+        }, f, ensure_ascii=False, indent=2)
+
+# =========================
+# Encodage + mesures
+# =========================
+
+def encode_audio(src_path: str, out_path: str, codec: str, ffmetadata: Path | None = None) -> Dict[str, Any]:
+    """Encode src_path (PCM/WAV) avec le preset `codec`. Retourne taille, débit et temps d'encodage."""
+    preset = get_codec(codec)
+    cmd = ["ffmpeg", "-y", "-i", str(src_path)]
+    if ffmetadata:
+        cmd += ["-i", str(ffmetadata), "-map", "0:a", "-map_metadata", "1", "-map_chapters", "1"]
+    cmd += ["-vn", *preset["args"], "-f", preset["format"], str(out_path)]
+    t0 = time.time()
+    run_ffmpeg(cmd)
+    encode_sec = time.time() - t0
+    return codec_stats(out_path, codec, encode_sec)
+
+def codec_stats(path: str, codec: str, encode_sec: float) -> Dict[str, Any]:
+    size = Path(path).stat().st_size
+    try:
+        duration = probe_duration(path)
+    except Exception:
+        duration = 0.0
+    return {
+        "codec": codec,
+        "path": str(path),
+        "bytes": size,
+        "base64_bytes": 4 * ((size + 2) // 3),
+        "duration": duration,
+        "kbps": (size * 8 / 1000.0 / duration) if duration else 0.0,
+        "encode_sec": encode_sec,
+    }
+
+def format_codec_stats(st: Dict[str, Any]) -> str:
+    return (f"{st['codec']:<8} {st['bytes'] / 1e6:7.2f} MB  (upload base64 {st['base64_bytes'] / 1e6:7.2f} MB)  "
+            f"{st['kbps']:6.1f} kbps  encode {st['encode_sec']:6.2f}s")
+
+def compare_codecs(src_path: str, out_dir: str, codecs: List[str] | None = None) -> List[Dict[str, Any]]:
+    """Encode le même audio avec chaque preset et renvoie les mesures (codecs indisponibles ignorés)."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    report = []
+    for name in codecs or list(CODECS):
+        try:
+            report.append(encode_audio(src_path, str(out / f"bestof_{name}{CODECS[name]['ext']}"), name))
+        except RuntimeError as e:
+            print(f"[WARN] Codec {name} indisponible: {str(e).splitlines()[-1] if str(e) else e}")
+    for st in report:
+        print(f"[INFO] {format_codec_stats(st)}")
+    with open(out / "codec_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
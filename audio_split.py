@@ -0,0 +1,210 @@
+import re
+import json
+import tempfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Callable
+
+# Découpe des longs enregistrements aux silences, en morceaux bornés,
+# transcription parallèle des morceaux puis recollage (texte + timestamps mots)
+# avec dédoublonnage des recouvrements aux frontières.
+# Uniquement ffmpeg/ffprobe en streaming (pas de gros buffers en RAM).
+
+# =========================
+# Utils ffmpeg
+# =========================
+
+def run_ffmpeg(cmd: List[str]):
+    # Fail fast with readable error
+    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {' '.join(cmd)}\n{p.stderr}")
+    return p
+
+def probe_duration(path: str) -> float:
+    p = run_ffmpeg([
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "json", str(path),
+    ])
+    return float(json.loads(p.stdout)["format"]["duration"])
+
+_SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+def detect_silences(path: str, noise_db: float = -35.0, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """Liste des silences [(start, end)] détectés par le filtre ffmpeg silencedetect."""
+    p = run_ffmpeg([
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", str(path),
+        "-vn",
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-",
+    ])
+    silences = []
+    start = None
+    for line in p.stderr.splitlines():
+        m = _SILENCE_START_RE.search(line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            continue
+        m = _SILENCE_END_RE.search(line)
+        if m and start is not None:
+            silences.append((start, float(m.group(1))))
+            start = None
+    return silences
+
+# =========================
+# 1) Plan de découpe
+# =========================
+
+def plan_chunks(duration: float, silences: List[Tuple[float, float]],
+                max_chunk_sec: float = 600.0, min_chunk_sec: float = 120.0,
+                overlap_sec: float = 1.0) -> List[Dict[str, float]]:
+    """
+    Choisit des points de coupe au milieu des silences, au plus tard possible avant max_chunk_sec.
+    Sans silence exploitable dans [min_chunk_sec, max_chunk_sec], coupe franche à max_chunk_sec.
+    La dernière coupe équilibre les deux derniers morceaux (silence le plus proche du milieu, sinon
+    coupe au milieu) pour ne pas laisser un mini-morceau de fin.
+    Chaque morceau déborde de overlap_sec de chaque côté ("start"/"end") ; la zone
+    "keep_start"/"keep_end" (sans recouvrement) sert au recollage.
+    """
+    mids = sorted((s + e) / 2.0 for s, e in silences)
+    cuts = [0.0]
+    cur = 0.0
+    while duration - cur > max_chunk_sec:
+        remaining = duration - cur
+        if remaining <= 2 * max_chunk_sec:
+            lo = max(duration - max_chunk_sec, cur + min_chunk_sec)
+            hi = min(cur + max_chunk_sec, duration - min_chunk_sec)
+            target = cur + remaining / 2.0
+            candidates = [m for m in mids if lo <= m <= hi]
+            cut = min(candidates, key=lambda m: abs(m - target)) if candidates else target
+        else:
+            lo, hi = cur + min_chunk_sec, cur + max_chunk_sec
+            candidates = [m for m in mids if lo <= m <= hi]
+            cut = candidates[-1] if candidates else hi
+        cuts.append(cut)
+        cur = cut
+    cuts.append(duration)
+
+    chunks = []
+    for k in range(len(cuts) - 1):
+        keep_start, keep_end = cuts[k], cuts[k + 1]
+        chunks.append({
+            "start": max(0.0, keep_start - overlap_sec) if k > 0 else 0.0,
+            "end": min(duration, keep_end + overlap_sec),
+            "keep_start": keep_start,
+            "keep_end": keep_end,
+        })
+    return chunks
+
+def export_chunks(path: str, chunks: List[Dict[str, float]], out_dir: str | None = None,
+                  bitrate: str = "64k") -> List[Path]:
+    """Exporte chaque morceau en MP3 mono 16 kHz (suffisant pour l'ASR, ~0.5 MB/min à 64k)."""
+    tempdir = Path(out_dir) if out_dir else Path(tempfile.mkdtemp(prefix="whx_chunks_"))
+    tempdir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for idx, c in enumerate(chunks):
+        part = tempdir / f"chunk_{idx:04d}.mp3"
+        run_ffmpeg([
+            "ffmpeg", "-y",
+            "-ss", f"{c['start']:.3f}",
+            "-to", f"{c['end']:.3f}",
+            "-i", str(path),
+            "-vn", "-ac", "1", "-ar", "16000",
+            "-c:a", "libmp3lame", "-b:a", bitrate,
+            str(part),
+        ])
+        files.append(part)
+    return files
+
+def split_on_silence(path: str, max_chunk_sec: float = 600.0, min_chunk_sec: float = 120.0,
+                     overlap_sec: float = 1.0, noise_db: float = -35.0, min_silence: float = 0.5,
+                     out_dir: str | None = None, max_bytes: int | None = None) -> List[Dict[str, Any]]:
+    """
+    Découpe path aux silences. Retour: [{"path", "start", "end", "keep_start", "keep_end"}].
+    Un fichier assez court est rendu tel quel, sauf s'il dépasse max_bytes (ex: WAV): il est alors
+    ré-encodé en un seul morceau compressé.
+    """
+    duration = probe_duration(path)
+    if duration <= max_chunk_sec:
+        whole = {"start": 0.0, "end": duration, "keep_start": 0.0, "keep_end": duration}
+        if not max_bytes or Path(path).stat().st_size <= max_bytes:
+            return [{**whole, "path": Path(path)}]
+        files = export_chunks(path, [whole], out_dir=out_dir)
+        print(f"[INFO] {Path(path).name}: ré-encodé ({Path(path).stat().st_size / 1e6:.1f} MB -> "
+              f"{files[0].stat().st_size / 1e6:.1f} MB)")
+        return [{**whole, "path": files[0]}]
+    silences = detect_silences(path, noise_db=noise_db, min_silence=min_silence)
+    chunks = plan_chunks(duration, silences, max_chunk_sec=max_chunk_sec,
+                         min_chunk_sec=min_chunk_sec, overlap_sec=overlap_sec)
+    files = export_chunks(path, chunks, out_dir=out_dir)
+    print(f"[INFO] {Path(path).name}: {len(chunks)} morceaux (~{max_chunk_sec:.0f}s max, {len(silences)} silences)")
+    return [{**c, "path": f} for c, f in zip(chunks, files)]
+
+# =========================
+# 2) Transcription parallèle
+# =========================
+
+def transcribe_chunks_parallel(chunks: List[Dict[str, Any]], transcribe: Callable[[Dict[str, Any]], Any],
+                               workers: int = 4) -> List[Any]:
+    """Applique transcribe(chunk) en parallèle ; résultats dans l'ordre des morceaux."""
+    if len(chunks) == 1 or workers <= 1:
+        return [transcribe(c) for c in chunks]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(transcribe, chunks))
+
+# =========================
+# 3) Recollage
+# =========================
+
+def stitch_word_segments(chunks: List[Dict[str, Any]], word_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Recolle les word_segments (timestamps locaux à chaque morceau) sur la timeline d'origine.
+    Dédoublonnage: un mot n'est gardé que par le morceau dont la zone [keep_start, keep_end)
+    contient son milieu. Les mots sans timestamps (non alignés) sont ignorés.
+    """
+    out = []
+    last = len(chunks) - 1
+    for k, (c, words) in enumerate(zip(chunks, word_lists)):
+        for w in words or []:
+            if "start" not in w or "end" not in w:
+                continue
+            start = float(w["start"]) + c["start"]
+            end = float(w["end"]) + c["start"]
+            mid = (start + end) / 2.0
+            if mid < c["keep_start"] or (mid >= c["keep_end"] and k != last):
+                continue
+            out.append({**w, "start": start, "end": end})
+    out.sort(key=lambda w: w["start"])
+    return out
+
+def _norm_word(w: str) -> str:
+    return re.sub(r"[^\w]", "", w.lower())
+
+def merge_overlapping_text(a: str, b: str, max_words: int = 40, min_match: int = 2) -> str:
+    """
+    Concatène deux transcriptions consécutives en retirant le début de b qui répète la fin de a
+    (plus long suffixe de a == préfixe de b, comparaison sans casse ni ponctuation).
+    """
+    a_words, b_words = a.split(), b.split()
+    if not a_words:
+        return b.strip()
+    if not b_words:
+        return a.strip()
+    a_norm = [_norm_word(w) for w in a_words[-max_words:]]
+    b_norm = [_norm_word(w) for w in b_words[:max_words]]
+    best = 0
+    for k in range(min(len(a_norm), len(b_norm)), min_match - 1, -1):
+        if a_norm[-k:] == b_norm[:k]:
+            best = k
+            break
+    return " ".join(a_words + b_words[best:])
+
+def stitch_texts(texts: List[str], max_words: int = 40) -> str:
+    out = ""
+    for t in texts:
+        out = merge_overlapping_text(out, t or "", max_words=max_words)
+    return out
@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import mimetypes
+import subprocess
+from pathlib import Path
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable
+
+import requests
+
+# Client Python des endpoints du web-app GAS (?action=...&token=...) et du endpoint prompt (?docId=...).
+# Remplace les curl séparés des Jenkinsfiles et le requests.get de fetch_prompt:
+# - une Session partagée (keep-alive, pool de connexions): un seul handshake TLS / chaîne de redirections
+# - retries avec backoff + jitter sur 429/408/5xx et erreurs réseau (cf. shouldRetryStatus_)
+# - cache local des prompts par doc_id (TTL + hash de contenu)
+# - statuts de plusieurs dates en parallèle sur la même session
+# - `process`: status -> zip-id -> téléchargement -> best-of -> upload -> archive avec UN client
+
+DEFAULT_CACHE_DIR = ".gas_cache"
+PROMPT_TTL_SEC = 3600
+
+# Types MIME des best-of (cf. audio_codecs.CODECS), indépendants de la base mimetypes du système
+BESTOF_MIME_BY_EXT = {".mp3": "audio/mpeg", ".opus": "audio/ogg", ".ogg": "audio/ogg", ".m4a": "audio/mp4"}
+
+BESTOF_SCRIPT = Path(__file__).resolve().with_name("zip_bestof_whisperx_jenk.py")
+
+def should_retry_status(code: int) -> bool:
+    """Codes HTTP considérés comme transitoires pour retry (cf. shouldRetryStatus_)."""
+    return code == 429 or code == 408 or (500 <= code <= 599)
+
+def compute_backoff_with_jitter(base_ms: int, attempt: int) -> int:
+    """Exponential backoff + jitter 0..300ms (cf. computeBackoffWithJitter_)."""
+    jitter = random.randint(0, 299)
+    return int(base_ms * (2 ** (attempt - 1))) + jitter
+
+
+class GasClient:
+
+    def __init__(self, base_url: str | None = None, token: str | None = None, prompt_url: str | None = None,
+                 cache_dir: str = DEFAULT_CACHE_DIR, prompt_ttl: float = PROMPT_TTL_SEC,
+                 timeout: float = 60.0, max_attempts: int = 4, backoff_ms: int = 1500, pool_size: int = 8):
+        self.base_url = base_url
+        self.token = token
+        self.prompt_url = prompt_url
+        self.cache_dir = Path(cache_dir)
+        self.prompt_ttl = prompt_ttl
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_ms = backoff_ms
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "GasClient":
+        """GAS_BASE_URL / GAS_TOKEN (web-app) et GAS_URL (prompts), comme dans les Jenkinsfiles."""
+        return cls(
+            base_url=kwargs.pop("base_url", None) or os.environ.get("GAS_BASE_URL"),
+            token=kwargs.pop("token", None) or os.environ.get("GAS_TOKEN"),
+            prompt_url=kwargs.pop("prompt_url", None) or os.environ.get("GAS_URL"),
+            **kwargs,
+        )
+
+    # ---------- HTTP ----------
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                if attempt < self.max_attempts:
+                    delay = compute_backoff_with_jitter(self.backoff_ms, attempt)
+                    print(f"[WARN] GAS {method}: tentative {attempt}/{self.max_attempts} exception ({e}). Retry dans {delay} ms.",
+                          file=sys.stderr)
+                    time.sleep(delay / 1000.0)
+                    continue
+                raise
+            if should_retry_status(r.status_code) and attempt < self.max_attempts:
+                delay = compute_backoff_with_jitter(self.backoff_ms, attempt)
+                print(f"[WARN] GAS {method}: tentative {attempt}/{self.max_attempts} échouée (HTTP {r.status_code}). Retry dans {delay} ms.",
+                      file=sys.stderr)
+                time.sleep(delay / 1000.0)
+                continue
+            r.raise_for_status()
+            return r
+        raise RuntimeError("GAS: épuisement des retries")
+
+    def _params(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not (self.base_url and self.token):
+            raise RuntimeError("GAS_BASE_URL / GAS_TOKEN manquants.")
+        return {"action": action, "token": self.token, **params}
+
+    def get(self, action: str, **params) -> Dict[str, Any]:
+        return self._request("GET", self.base_url, params=self._params(action, params)).json()
+
+    def post(self, action: str, payload: Dict[str, Any] | None = None, **params) -> Dict[str, Any]:
+        r = self._request(
+            "POST", self.base_url,
+            params=self._params(action, params),
+            data=json.dumps(payload) if payload is not None else "",
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            return r.json()
+        except ValueError:
+            return {"raw": r.text}
+
+    # ---------- Actions web-app ----------
+
+    def status(self, date: str) -> Dict[str, Any]:
+        return self.get("status", date=date)
+
+    def statuses(self, dates: List[str], workers: int | None = None) -> Dict[str, Dict[str, Any]]:
+        """Statuts de plusieurs dates en parallèle sur la session partagée. Erreur => {"error": ...}."""
+        def one(d: str) -> Dict[str, Any]:
+            try:
+                return self.status(d)
+            except Exception as e:
+                return {"error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(dates), workers or self.pool_size))) as pool:
+            return dict(zip(dates, pool.map(one, dates)))
+
+    def pending_dates(self, dates: List[str]) -> List[str]:
+        """
+        Dates avec des audios et sans best-of (même règle que l'étape 'Check status').
+        Un statut en échec lève RuntimeError: GAS indisponible ne doit pas passer pour "rien à traiter".
+        """
+        st = self.statuses(dates)
+        failed = [f"{d}: {st[d]['error']}" for d in dates if "error" in st[d]]
+        if failed:
+            raise RuntimeError("GAS status en échec pour " + "; ".join(failed))
+        return [d for d in dates if st[d].get("hasInput") and not st[d].get("hasBestof")]
+
+    def zip_file_id(self, date: str) -> str | None:
+        """ID Drive du ZIP des audios du jour ; None si réponse vide/invalide, sans id, ou erreur HTTP après retries."""
+        try:
+            return self.get("zip", date=date).get("id") or None
+        except (ValueError, requests.RequestException) as e:
+            print(f"[WARN] GAS zip {date}: {e}", file=sys.stderr)
+            return None
+
+    def upload_bestof(self, date: str, path: str, mime_type: str | None = None) -> Dict[str, Any]:
+        """Upload JSON + base64 (préserve l'intégrité binaire), nommé bestof_<date><ext>."""
+        p = Path(path)
+        mime = (mime_type or BESTOF_MIME_BY_EXT.get(p.suffix.lower())
+                or mimetypes.guess_type(p.name)[0] or "application/octet-stream")
+        payload = {
+            "filename": f"bestof_{date}{p.suffix}",
+            "mimeType": mime,
+            "data": base64.b64encode(p.read_bytes()).decode("ascii"),
+        }
+        return self.post("uploadBestof", payload, date=date)
+
+    def archive(self, date: str) -> Dict[str, Any]:
+        return self.post("archive", None, date=date)
+
+    def publish(self, date: str, path: str, mime_type: str | None = None) -> Dict[str, Any]:
+        """Upload du best-of puis archivage des audios du jour."""
+        uploaded = self.upload_bestof(date, path, mime_type)
+        print(f"[INFO] {date}: best-of uploadé ({Path(path).name}) -> {json.dumps(uploaded, ensure_ascii=False)}")
+        archived = self.archive(date)
+        print(f"[INFO] {date}: audios archivés -> {json.dumps(archived, ensure_ascii=False)}")
+        return {"upload": uploaded, "archive": archived}
+
+    # ---------- Prompts (cache local) ----------
+
+    def fetch_doc_text(self, doc_id: str) -> str:
+        """Texte brut d'un Google Doc via ?docId=... (sans cache)."""
+        if not self.prompt_url:
+            raise RuntimeError("GAS_URL manquant (endpoint des prompts).")
+        return self._request("GET", self.prompt_url, params={"docId": doc_id}, timeout=30).text.strip()
+
+    def _prompt_cache_path(self, doc_id: str) -> Path:
+        return self.cache_dir / f"prompt_{doc_id}.json"
+
+    def fetch_prompt(self, doc_id: str, max_age: float | None = None) -> str:
+        """
+        Texte du Doc prompt via ?docId=... . Servi depuis le cache tant qu'il a moins de prompt_ttl s.
+        Si le rafraîchissement échoue, on retombe sur la dernière version en cache.
+        """
+        ttl = self.prompt_ttl if max_age is None else max_age
+        path = self._prompt_cache_path(doc_id)
+        cached = json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+        if cached and time.time() - cached["fetched_at"] < ttl:
+            return cached["text"]
+
+        try:
+            text = self.fetch_doc_text(doc_id)
+        except Exception as e:
+            if cached:
+                print(f"[WARN] Prompt {doc_id}: rafraîchissement impossible ({e}), version en cache utilisée.", file=sys.stderr)
+                return cached["text"]
+            raise
+
+        sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if cached and cached.get("sha256") != sha:
+            print(f"[INFO] Prompt {doc_id} modifié depuis le dernier fetch.", file=sys.stderr)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"fetched_at": time.time(), "sha256": sha, "text": text}, ensure_ascii=False),
+                        encoding="utf-8")
+        return text
+
+# =========================
+# CLI (utilisée par les Jenkinsfiles)
+# =========================
+
+def dates_days_ago(first: int, last: int) -> List[str]:
+    now = datetime.utcnow()
+    return [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(first, last + 1)]
+
+def bestof_file(out_dir: Path) -> Path:
+    """Fichier best-of d'un run: nommé par l'index des chapitres (extension selon le codec)."""
+    chapters = out_dir / "chapters.json"
+    if chapters.exists():
+        return out_dir / json.loads(chapters.read_text(encoding="utf-8"))["audio"]
+    return out_dir / "bestof.mp3"
+
+def process_dates(client: GasClient, dates: List[str], bestof_args: List[str], skip_missing_zip: bool = False,
+                  work_dir: str = ".", run: Callable[..., Any] = subprocess.run) -> List[str]:
+    """
+    Pipeline Jenkins complet sur un seul client (une session HTTP):
+    statuts -> pour chaque date à traiter: zip-id -> gdown -> best-of -> upload -> archive.
+    ZIP introuvable: date ignorée si skip_missing_zip (backfill), sinon RuntimeError (daily).
+    Retourne les dates publiées.
+    """
+    pending = client.pending_dates(dates)
+    if not pending:
+        print(f"[INFO] Rien à traiter pour {', '.join(dates)}.")
+        return []
+
+    done = []
+    for date in pending:
+        file_id = client.zip_file_id(date)
+        if not file_id:
+            if skip_missing_zip:
+                print(f"[WARN] Pas de ZIP pour {date}, date ignorée.")
+                continue
+            raise RuntimeError(f"Pas de ZIP pour {date}.")
+
+        zip_path = Path(work_dir) / f"audios_{date}.zip"
+        out_dir = Path(work_dir) / f"out_{date}"
+        run(["gdown", file_id, "-O", str(zip_path)], check=True)
+        run([sys.executable, "-u", str(BESTOF_SCRIPT), str(zip_path), "--out_dir", str(out_dir), *bestof_args],
+            check=True)
+
+        path = bestof_file(out_dir)
+        if not path.exists():
+            raise RuntimeError(f"Best-of introuvable pour {date}: {path}")
+        client.publish(date, str(path))
+        done.append(date)
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description="Client du web-app GAS (status/zip/uploadBestof/archive/prompt)")
+    parser.add_argument("--base_url", default=None, help="défaut: $GAS_BASE_URL")
+    parser.add_argument("--token", default=None, help="défaut: $GAS_TOKEN")
+    parser.add_argument("--prompt_url", default=None, help="défaut: $GAS_URL")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("status", help="Statut JSON d'une ou plusieurs dates")
+    p.add_argument("dates", nargs="+")
+
+    p = sub.add_parser("pending", help="Dates à traiter (hasInput && !hasBestof), une par ligne")
+    p.add_argument("dates", nargs="*")
+    p.add_argument("--days_ago", nargs=2, type=int, metavar=("FIRST", "LAST"),
+                   help="Plage relative (UTC), ex: --days_ago 9 30")
+
+    p = sub.add_parser("zip-id", help="ID Drive du ZIP du jour (vide si absent)")
+    p.add_argument("date")
+
+    p = sub.add_parser("upload", help="Upload du best-of")
+    p.add_argument("date")
+    p.add_argument("file")
+    p.add_argument("--mime_type", default=None)
+
+    p = sub.add_parser("archive", help="Archive les audios du jour")
+    p.add_argument("date")
+
+    p = sub.add_parser("publish", help="Upload du best-of puis archive, sur la même session")
+    p.add_argument("date")
+    p.add_argument("file")
+    p.add_argument("--mime_type", default=None)
+
+    p = sub.add_parser("process", help="status -> zip-id -> gdown -> best-of -> upload -> archive (une session)")
+    p.add_argument("dates", nargs="*")
+    p.add_argument("--days_ago", nargs=2, type=int, metavar=("FIRST", "LAST"))
+    p.add_argument("--skip_missing_zip", action="store_true", help="Backfill: ignorer une date sans ZIP au lieu d'échouer")
+    p.add_argument("--work_dir", default=".")
+    p.epilog = "Les arguments après '--' sont passés à zip_bestof_whisperx_jenk.py."
+
+    p = sub.add_parser("prompt", help="Texte d'un Doc prompt (cache local)")
+    p.add_argument("doc_id")
+    p.add_argument("--max_age", type=float, default=None)
+
+    # process DATES... -- <arguments du best-of>
+    argv = sys.argv[1:]
+    bestof_args: List[str] = []
+    if "--" in argv:
+        i = argv.index("--")
+        argv, bestof_args = argv[:i], argv[i + 1:]
+    args = parser.parse_args(argv)
+    if bestof_args and args.cmd != "process":
+        parser.error("les arguments après '--' ne concernent que 'process'")
+    client = GasClient.from_env(base_url=args.base_url, token=args.token, prompt_url=args.prompt_url,
+                                cache_dir=args.cache_dir)
+
+    if args.cmd == "status":
+        res = client.statuses(args.dates)
+        print(json.dumps(res[args.dates[0]] if len(args.dates) == 1 else res, ensure_ascii=False))
+        if any("error" in r for r in res.values()):
+            sys.exit(1)
+    elif args.cmd == "pending":
+        dates = list(args.dates) + (dates_days_ago(*args.days_ago) if args.days_ago else [])
+        for d in client.pending_dates(dates):
+            print(d)
+    elif args.cmd == "zip-id":
+        print(client.zip_file_id(args.date) or "")
+    elif args.cmd == "upload":
+        print(json.dumps(client.upload_bestof(args.date, args.file, args.mime_type), ensure_ascii=False))
+    elif args.cmd == "archive":
+        print(json.dumps(client.archive(args.date), ensure_ascii=False))
+    elif args.cmd == "publish":
+        client.publish(args.date, args.file, args.mime_type)
+    elif args.cmd == "process":
+        dates = list(args.dates) + (dates_days_ago(*args.days_ago) if args.days_ago else [])
+        if not dates:
+            parser.error("process requiert des dates ou --days_ago")
+        process_dates(client, dates, bestof_args, skip_missing_zip=args.skip_missing_zip, work_dir=args.work_dir)
+    elif args.cmd == "prompt":
+        print(client.fetch_prompt(args.doc_id, max_age=args.max_age))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import json
+import math
+import time
+from typing import List, Dict, Any
+
+from openai import OpenAI, BadRequestError
+
+# Scoring GPT des segments (batchs JSON), utilisé par zip_bestof_whisperx_jenk.py.
+# Deux protocoles:
+# - "legacy":  {"scores": [{"i", "score", "label"}]}, segments avec start/end, label libre pour chaque segment
+# - "compact": entrée [[k, texte]] (k = indice local au batch), sortie {"s": [[k, score]]} contrainte
+#   par JSON schema ; labels demandés ensuite uniquement pour les clips retenus.
+# Les tokens de sortie dominent la latence: compact en produit ~5x moins.
+# Les consignes (prompt du Doc + protocole) sont en tête et identiques d'un batch à l'autre,
+# ce qui les rend éligibles au cache de prompt automatique d'OpenAI.
+
+# =========================
+# Client OpenAI
+# =========================
+
+_client = None  # créé au premier appel GPT: --scorer local n'exige ni clé ni réseau
+
+def get_openai_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI()
+    return _client
+
+# =========================
+# Protocoles
+# =========================
+
+COMPACT_SCORE_INSTRUCTION = (
+    "Entrée: liste JSON [[k, texte], ...]. "
+    "Réponds UNIQUEMENT avec {\"s\": [[k, score], ...]} : exactement un couple par segment reçu, "
+    "k = l'indice reçu, score numérique selon les consignes ci-dessus. Pas de texte, pas de label."
+)
+
+COMPACT_SCORE_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "segment_scores",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"s": {"type": "array", "items": {"type": "array", "items": {"type": "number"}}}},
+            "required": ["s"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+LABEL_INSTRUCTION = (
+    "Entrée: liste JSON [[k, texte], ...] de passages retenus. "
+    "Réponds UNIQUEMENT avec {\"l\": [[k, label], ...]} : un label court (6 mots max) par passage, "
+    "dans la langue du passage."
+)
+
+# =========================
+# Appels chat JSON
+# =========================
+
+# Modèles ayant refusé response_format=json_schema: repli json_object pour le reste du run
+_json_schema_unsupported: set = set()
+
+def _is_response_format_error(e: BadRequestError) -> bool:
+    """400 portant sur response_format / json_schema (et pas contexte trop long, entrée invalide, ...)."""
+    text = f"{getattr(e, 'param', None) or ''} {getattr(e, 'message', '')}".lower()
+    return "response_format" in text or "json_schema" in text
+
+def _chat_json(model: str, messages: List[Dict[str, str]], response_format: Dict[str, Any],
+               stats: List[Dict[str, Any]] | None, kind: str) -> str:
+    """
+    Appel chat JSON + mesure (tokens, cache, durée).
+    Repli sur json_object uniquement si le modèle refuse json_schema ; mémorisé pour les batches suivants.
+    """
+    t0 = time.time()
+    if response_format.get("type") == "json_schema" and model in _json_schema_unsupported:
+        response_format = {"type": "json_object"}
+    try:
+        completion = get_openai_client().chat.completions.create(
+            model=model, temperature=0.0, response_format=response_format, messages=messages,
+        )
+    except BadRequestError as e:
+        if response_format.get("type") != "json_schema" or not _is_response_format_error(e):
+            raise
+        print(f"[WARN] {model}: json_schema refusé ({getattr(e, 'message', e)}), repli sur json_object pour ce run.")
+        _json_schema_unsupported.add(model)
+        completion = get_openai_client().chat.completions.create(
+            model=model, temperature=0.0, response_format={"type": "json_object"}, messages=messages,
+        )
+    if stats is not None:
+        usage = getattr(completion, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        stats.append({
+            "kind": kind,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "seconds": time.time() - t0,
+        })
+    return completion.choices[0].message.content
+
+def openai_score_segments(segments, model: str, system_prompt: str, stats: List[Dict[str, Any]] | None = None):
+    """Protocole historique ("legacy")."""
+    payload_segments = [
+        {"i": s["i"], "start": round(s["start"], 2), "end": round(s["end"], 2), "text": s["text"][:3000]}
+        for s in segments
+    ]
+    user_prompt = (
+        "Analyse et score les segments suivants :\n"
+        f"{json.dumps(payload_segments, ensure_ascii=False)}"
+    )
+    content = _chat_json(model, [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ], {"type": "json_object"}, stats, "legacy")
+    try:
+        data = json.loads(content)
+        return data.get("scores", [])
+    except Exception:
+        return []
+
+def parse_compact_pairs(content: str, key: str, n: int) -> Dict[int, Any]:
+    """
+    Valide et répare une réponse [[k, valeur], ...]:
+    - k entier dans [0, n) (les floats entiers sont acceptés, le reste est ignoré, y compris Infinity/NaN)
+    - premier couple gardé en cas de doublon
+    - tolère les lignes {"i"/"k", "score"/"label"} et la clé "scores" du format historique
+    """
+    try:
+        data = json.loads(content)
+    except Exception:
+        return {}
+    rows = data.get(key, data.get("scores", [])) if isinstance(data, dict) else data
+    out: Dict[int, Any] = {}
+    for row in rows if isinstance(rows, list) else []:
+        if isinstance(row, dict):
+            row = [row.get("k", row.get("i")), row.get("score", row.get("label"))]
+        if not isinstance(row, (list, tuple)) or len(row) < 2:
+            continue
+        k, v = row[0], row[1]
+        try:
+            if float(k) != int(float(k)):
+                continue
+            k = int(float(k))
+        except (TypeError, ValueError, OverflowError):
+            continue
+        if 0 <= k < n and k not in out and v is not None:
+            out[k] = v
+    return out
+
+def openai_score_segments_compact(segments, model: str, system_prompt: str,
+                                  stats: List[Dict[str, Any]] | None = None, repair: bool = True) -> List[Dict[str, Any]]:
+    """Protocole compact. Retourne [{"i", "score"}] ; les indices manquants sont redemandés une fois."""
+    payload = [[k, s["text"][:3000]] for k, s in enumerate(segments)]
+    content = _chat_json(model, [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": COMPACT_SCORE_INSTRUCTION},
+        {"role": "user", "content": json.dumps(payload, ensure_ascii=False, separators=(",", ":"))}
+    ], COMPACT_SCORE_SCHEMA, stats, "compact")
+
+    scores = {}
+    for k, v in parse_compact_pairs(content, "s", len(segments)).items():
+        try:
+            score = float(v)
+        except (TypeError, ValueError):
+            continue
+        # NaN/Infinity (acceptés par json.loads) fausseraient le tri de la sélection
+        if math.isfinite(score):
+            scores[k] = score
+    missing = [k for k in range(len(segments)) if k not in scores]
+    if missing and repair:
+        print(f"[WARN] Scoring: {len(missing)} indice(s) manquant(s) sur {len(segments)}, nouvelle demande.")
+        redo = openai_score_segments_compact([segments[k] for k in missing], model, system_prompt, stats, repair=False)
+        for k, r in zip(missing, redo):
+            if r["score"] is not None:
+                scores[k] = r["score"]
+    return [{"i": s["i"], "score": scores.get(k)} for k, s in enumerate(segments)]
+
+def openai_label_segments(segments, model: str, system_prompt: str,
+                          stats: List[Dict[str, Any]] | None = None) -> Dict[int, str]:
+    """Labels courts, demandés uniquement pour les clips retenus. Retourne {i: label}."""
+    if not segments:
+        return {}
+    payload = [[k, s["text"][:3000]] for k, s in enumerate(segments)]
+    content = _chat_json(model, [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": LABEL_INSTRUCTION},
+        {"role": "user", "content": json.dumps(payload, ensure_ascii=False, separators=(",", ":"))}
+    ], {"type": "json_object"}, stats, "labels")
+    labels = parse_compact_pairs(content, "l", len(segments))
+    return {segments[k]["i"]: str(v) for k, v in labels.items()}
+
+# =========================
+# Batchs + mesures
+# =========================
+
+def batched(iterable, n):
+    batch = []
+    for x in iterable:
+        batch.append(x)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def score_all_segments_with_gpt(segments, model: str, system_prompt: str, batch_size: int = 150,
+                                protocol: str = "compact", stats: List[Dict[str, Any]] | None = None):
+    all_scores = []
+    for batch in batched(segments, batch_size):
+        if protocol == "legacy":
+            scores = openai_score_segments(batch, model=model, system_prompt=system_prompt, stats=stats)
+        else:
+            scores = openai_score_segments_compact(batch, model=model, system_prompt=system_prompt, stats=stats)
+        all_scores.extend(scores)
+    score_map = {}
+    for s in all_scores:
+        if "i" not in s or s.get("score") is None:
+            continue
+        try:
+            score = float(s["score"])
+            if math.isfinite(score):
+                score_map[int(s["i"])] = {"score": score, "label": s.get("label", ""), "source": "gpt"}
+        except (TypeError, ValueError, OverflowError):
+            continue
+    out = []
+    for s in segments:
+        meta = score_map.get(s["i"], {"score": 0.0, "label": "", "source": "missing"})
+        out.append({**s, **meta})
+    return out
+
+def summarize_score_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    tot = {"calls": len(stats), "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0}
+    for st in stats:
+        for k in ("prompt_tokens", "completion_tokens", "cached_tokens", "seconds"):
+            tot[k] += st[k]
+    return tot
+
+def format_score_stats(name: str, stats: List[Dict[str, Any]]) -> str:
+    t = summarize_score_stats(stats)
+    return (f"{name:<8} appels={t['calls']:3d}  prompt={t['prompt_tokens']:7d} (cache {t['cached_tokens']:6d})  "
+            f"sortie={t['completion_tokens']:6d}  durée={t['seconds']:6.1f}s")
@@ -0,0 +1,306 @@
+import re
+import json
+import time
+import zlib
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+# Scoreur local distillé des scores GPT (score_all_segments_with_gpt):
+# n-grammes de mots hachés (unigrammes + bigrammes) -> régression ridge linéaire, CPU uniquement.
+# - apprentissage hors ligne depuis les couples (texte, score) stockés à chaque run GPT
+# - prédiction vectorisée: une journée entière en bien moins d'une seconde, sans réseau
+# - "hybrid": seuls les segments incertains (proches du seuil de sélection, ou peu couverts
+#   par le vocabulaire appris) repartent chez GPT
+
+DEFAULT_STORE = "score_store.jsonl"
+DEFAULT_MODEL = "local_scorer.npz"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# =========================
+# Stockage des scores GPT
+# =========================
+
+def append_score_store(path: str, records: List[Dict[str, Any]]) -> int:
+    """Ajoute des couples {"text", "score", ...} au fichier JSONL (un par ligne)."""
+    if not records:
+        return 0
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    return len(records)
+
+def load_score_store(path: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Charge les couples (texte, score) dans l'ordre du store (chronologique). Un texte re-scoré prend
+    son dernier score ET sa dernière position, pour rester dans la partie récente (holdout).
+    """
+    by_text: Dict[str, float] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = json.loads(line)
+                score = float(r["score"])
+                by_text.pop(r["text"], None)
+                by_text[r["text"]] = score
+            except (ValueError, KeyError, TypeError):
+                continue
+    texts = list(by_text)
+    return texts, np.array([by_text[t] for t in texts], dtype=np.float64)
+
+# =========================
+# Features hachées (CSR)
+# =========================
+
+def featurize(texts: List[str], n_bits: int = 18) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Unigrammes + bigrammes de mots (minuscules), hachés sur 2^n_bits dimensions (crc32, stable
+    entre exécutions) avec signe, tf sous-linéaire et normalisation L2 par segment.
+    Retour CSR: (indptr, indices, values).
+    """
+    mask = (1 << n_bits) - 1
+    indptr = [0]
+    indices: List[int] = []
+    values: List[float] = []
+    for text in texts:
+        toks = _WORD_RE.findall(text.lower())
+        grams = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+        row: Dict[int, float] = {}
+        for g in grams:
+            h = zlib.crc32(g.encode("utf-8"))
+            idx = h & mask
+            row[idx] = row.get(idx, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        if row:
+            idx = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            val = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+            val = np.sign(val) * (1.0 + np.log(np.abs(val) + (val == 0)))
+            norm = np.linalg.norm(val)
+            if norm > 0:
+                val /= norm
+            indices.extend(idx.tolist())
+            values.extend(val.tolist())
+        indptr.append(len(indices))
+    return (np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int64),
+            np.array(values, dtype=np.float64))
+
+def _row_ids(indptr: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+def _matvec(w: np.ndarray, indptr: np.ndarray, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """X @ w pour une matrice CSR (lignes vides => 0)."""
+    n = len(indptr) - 1
+    out = np.zeros(n)
+    nonempty = indptr[1:] > indptr[:-1]
+    if indices.size and nonempty.any():
+        out[nonempty] = np.add.reduceat(w[indices] * values, indptr[:-1][nonempty])
+    return out
+
+def _rmatvec(r: np.ndarray, rows: np.ndarray, indices: np.ndarray, values: np.ndarray, dim: int) -> np.ndarray:
+    """X.T @ r pour une matrice CSR."""
+    return np.bincount(indices, weights=r[rows] * values, minlength=dim)
+
+# =========================
+# Métriques d'accord
+# =========================
+
+def _rank(x: np.ndarray) -> np.ndarray:
+    r = np.empty(len(x))
+    r[np.argsort(x, kind="mergesort")] = np.arange(len(x))
+    return r
+
+def agreement(pred: np.ndarray, ref: np.ndarray, keep_frac: float = 0.2) -> Dict[str, float]:
+    """Accord scoreur local vs GPT: MAE, RMSE, Pearson, Spearman, recouvrement du top keep_frac."""
+    pred = np.asarray(pred, dtype=np.float64)
+    ref = np.asarray(ref, dtype=np.float64)
+    n = len(ref)
+    if n == 0:
+        return {"n": 0}
+    out = {
+        "n": n,
+        "mae": float(np.mean(np.abs(pred - ref))),
+        "rmse": float(np.sqrt(np.mean((pred - ref) ** 2))),
+    }
+    if n > 1 and np.std(pred) > 0 and np.std(ref) > 0:
+        out["pearson"] = float(np.corrcoef(pred, ref)[0, 1])
+        out["spearman"] = float(np.corrcoef(_rank(pred), _rank(ref))[0, 1])
+    k = max(1, int(round(n * keep_frac)))
+    top_pred = set(np.argsort(-pred, kind="mergesort")[:k].tolist())
+    top_ref = set(np.argsort(-ref, kind="mergesort")[:k].tolist())
+    out[f"top{int(keep_frac * 100)}_overlap"] = len(top_pred & top_ref) / k
+    return out
+
+def format_agreement(m: Dict[str, float]) -> str:
+    return "  ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in m.items())
+
+# =========================
+# Modèle
+# =========================
+
+class LocalScorer:
+
+    def __init__(self, n_bits: int = 18, l2: float = 1.0):
+        self.n_bits = n_bits
+        self.l2 = l2
+        self.w = np.zeros(1 << n_bits)
+        self.bias = 0.0
+        self.seen = np.zeros(1 << n_bits, dtype=bool)
+        self.score_min = 0.0
+        self.score_max = 5.0
+        self.rmse = 1.0
+        self.n_train = 0
+
+    def fit(self, texts: List[str], scores: np.ndarray, max_iter: int = 200, tol: float = 1e-6) -> "LocalScorer":
+        """Ridge (y centré) résolu par gradient conjugué sur (XᵀX + λI) w = Xᵀ(y - ȳ)."""
+        y = np.asarray(scores, dtype=np.float64)
+        indptr, indices, values = featurize(texts, self.n_bits)
+        rows = _row_ids(indptr)
+        dim = 1 << self.n_bits
+
+        self.bias = float(y.mean()) if len(y) else 0.0
+        self.score_min = float(y.min()) if len(y) else 0.0
+        self.score_max = float(y.max()) if len(y) else 0.0
+        self.n_train = len(y)
+        self.seen = np.zeros(dim, dtype=bool)
+        self.seen[indices] = True
+
+        def A(v: np.ndarray) -> np.ndarray:
+            return _rmatvec(_matvec(v, indptr, indices, values), rows, indices, values, dim) + self.l2 * v
+
+        b = _rmatvec(y - self.bias, rows, indices, values, dim)
+        w = np.zeros(dim)
+        r = b.copy()
+        p = r.copy()
+        rs = r @ r
+        b_norm = np.sqrt(b @ b) or 1.0
+        for _ in range(max_iter):
+            Ap = A(p)
+            alpha = rs / (p @ Ap)
+            w += alpha * p
+            r -= alpha * Ap
+            rs_new = r @ r
+            if np.sqrt(rs_new) / b_norm < tol:
+                break
+            p = r + (rs_new / rs) * p
+            rs = rs_new
+        self.w = w
+        return self
+
+    def predict(self, texts: List[str], return_coverage: bool = False):
+        """Scores prédits (bornés à la plage vue à l'entraînement) ; option: couverture des features."""
+        indptr, indices, values = featurize(texts, self.n_bits)
+        pred = np.clip(_matvec(self.w, indptr, indices, values) + self.bias, self.score_min, self.score_max)
+        if not return_coverage:
+            return pred
+        counts = np.diff(indptr)
+        seen = _matvec(self.seen.astype(np.float64), indptr, indices, np.ones_like(values))
+        coverage = np.divide(seen, counts, out=np.zeros(len(counts)), where=counts > 0)
+        return pred, coverage
+
+    def uncertain(self, pred: np.ndarray, coverage: np.ndarray, keep_frac: float,
+                  margin: float = 1.0, min_coverage: float = 0.5, max_frac: float = 0.3) -> np.ndarray:
+        """
+        Indices des segments à renvoyer à GPT: prédiction à moins de margin*RMSE du seuil de sélection
+        (quantile 1-keep_frac des prédictions) ou couverture du vocabulaire < min_coverage.
+        Au plus max_frac des segments, les plus incertains d'abord.
+        """
+        n = len(pred)
+        if n == 0:
+            return np.array([], dtype=np.int64)
+        threshold = np.quantile(pred, 1.0 - keep_frac)
+        dist = np.abs(pred - threshold) / max(self.rmse, 1e-6)
+        flagged = (dist < margin) | (coverage < min_coverage)
+        order = np.lexsort((dist, ~flagged))  # flagged d'abord, puis les plus proches du seuil
+        limit = min(int(flagged.sum()), int(np.ceil(n * max_frac)))
+        return np.sort(order[:limit])
+
+    def save(self, path: str) -> None:
+        nz = np.flatnonzero(self.w)
+        np.savez_compressed(
+            path, n_bits=self.n_bits, l2=self.l2, w_idx=nz, w_val=self.w[nz],
+            seen_idx=np.flatnonzero(self.seen), bias=self.bias,
+            score_min=self.score_min, score_max=self.score_max, rmse=self.rmse, n_train=self.n_train,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalScorer":
+        z = np.load(path)
+        m = cls(n_bits=int(z["n_bits"]), l2=float(z["l2"]))
+        m.w[z["w_idx"]] = z["w_val"]
+        m.seen[z["seen_idx"]] = True
+        m.bias = float(z["bias"])
+        m.score_min = float(z["score_min"])
+        m.score_max = float(z["score_max"])
+        m.rmse = float(z["rmse"])
+        m.n_train = int(z["n_train"])
+        return m
+
+def train_with_holdout(texts: List[str], scores: np.ndarray, holdout: float = 0.2, n_bits: int = 18,
+                       l2: float = 1.0, keep_frac: float = 0.2) -> Tuple[LocalScorer, Dict[str, float]]:
+    """
+    Évalue sur les derniers `holdout` couples (ordre du store = chronologique), puis
+    ré-entraîne sur tout ; le RMSE de validation sert de marge d'incertitude en mode hybrid.
+    """
+    n = len(texts)
+    n_val = int(n * holdout) if n >= 10 else 0
+    metrics: Dict[str, float] = {}
+    rmse = None
+    if n_val:
+        m = LocalScorer(n_bits=n_bits, l2=l2).fit(texts[:-n_val], scores[:-n_val])
+        metrics = agreement(m.predict(texts[-n_val:]), scores[-n_val:], keep_frac=keep_frac)
+        rmse = metrics["rmse"]
+    model = LocalScorer(n_bits=n_bits, l2=l2).fit(texts, scores)
+    model.rmse = rmse if rmse else float(np.std(scores)) if n else 1.0
+    return model, metrics
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoreur local distillé des scores GPT (train / eval)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("train", help="Entraîne depuis le store JSONL (texte, score)")
+    p.add_argument("--store", default=DEFAULT_STORE)
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--holdout", type=float, default=0.2, help="Part finale du store gardée pour la validation")
+    p.add_argument("--n_bits", type=int, default=18, help="Dimensions hachées = 2^n_bits")
+    p.add_argument("--l2", type=float, default=1.0)
+    p.add_argument("--keep_pct", type=float, default=20.0, help="Pour la métrique de recouvrement du top")
+
+    p = sub.add_parser("eval", help="Accord du modèle avec les scores GPT d'un store")
+    p.add_argument("--store", default=DEFAULT_STORE)
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--keep_pct", type=float, default=20.0)
+
+    args = parser.parse_args()
+    texts, scores = load_score_store(args.store)
+    if not texts:
+        raise RuntimeError(f"Aucun couple (texte, score) dans {args.store}.")
+    keep_frac = max(0.01, min(1.0, args.keep_pct / 100.0))
+
+    if args.cmd == "train":
+        t0 = time.time()
+        model, metrics = train_with_holdout(texts, scores, holdout=args.holdout, n_bits=args.n_bits,
+                                            l2=args.l2, keep_frac=keep_frac)
+        model.save(args.model)
+        print(f"[INFO] Entraîné sur {len(texts)} segments en {time.time() - t0:.1f}s -> {args.model}")
+        if metrics:
+            print(f"[INFO] Validation (derniers {metrics['n']}): {format_agreement(metrics)}")
+    else:
+        model = LocalScorer.load(args.model)
+        t0 = time.time()
+        pred = model.predict(texts)
+        print(f"[INFO] {len(texts)} segments scorés en {time.time() - t0:.3f}s")
+        print(f"[INFO] Accord vs GPT: {format_agreement(agreement(pred, scores, keep_frac=keep_frac))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Callable
+
+import requests
+
+from gas_client import GasClient, should_retry_status, compute_backoff_with_jitter
+
+# Résumés Daily / Weekly / Monthly en map-reduce hiérarchique,
+# à la place du prompt unique de generateSummaryFromDocs_ / summarizeAsHTMLFromDocs_ (ai.gs):
+#   chunk (budget tokens) -> digest de transcription -> digest du jour -> (digest de semaine) -> résumé HTML
+# - map: les chunks sont résumés en parallèle
+# - reduce: les digests sont fusionnés par groupes tenant dans le budget, récursivement
+# - chaque digest est mis en cache par hash de contenu: weekly/monthly réutilisent le travail
+#   des dailies au lieu de relire et re-résumer le texte brut.
+
+OPENAI_CHAT_API_URL = "https://api.openai.com/v1/chat/completions"
+
+# Même consigne de format que summarizeAsHTMLFromDocs_
+HTML_SYSTEM_INSTRUCTION = (
+    "FORMAT: Return a complete, valid, self-contained HTML fragment using only semantic tags "
+    "(<h1..h3>, <p>, <ul>/<ol>/<li>, <strong>, <em>, <blockquote>, <pre><code>, <a>). "
+    "No Markdown. Do not include scripts or external resources. Start with a single <h1>."
+)
+
+MAP_INSTRUCTION = (
+    "You condense an excerpt of a personal voice-memo transcript into a faithful digest for a later summary. "
+    "Keep every distinct topic, decision, task, feeling, name, date and number; drop filler and repetitions. "
+    "Write plain text bullet points in the language of the transcript. Do not add anything that is not in the text."
+)
+
+REDUCE_INSTRUCTION = (
+    "You merge several digests of voice-memo transcripts into one digest, in chronological order. "
+    "Merge duplicates, keep every distinct topic, decision, task, feeling, name, date and number. "
+    "Write plain text bullet points in the language of the digests. Do not add anything that is not in the digests."
+)
+
+PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 35}  # monthly = 5 semaines, comme getLast5WeeklySummaries_
+
+# =========================
+# Tokens & chunking
+# =========================
+
+def approx_tokens(text: str) -> int:
+    """Estimation grossière (~4 caractères par token), suffisante pour budgéter les prompts."""
+    return len(text) // 4 + 1
+
+def chunk_text(text: str, budget_tokens: int) -> List[str]:
+    """Découpe par paragraphes/lignes puis phrases, en blocs de <= budget_tokens (approx)."""
+    max_chars = budget_tokens * 4
+    pieces = []
+    for para in re.split(r"\n\s*\n|\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        for sent in re.split(r"(?<=[.!?…])\s+", para):
+            while len(sent) > max_chars:
+                pieces.append(sent[:max_chars])
+                sent = sent[max_chars:]
+            if sent:
+                pieces.append(sent)
+
+    chunks = []
+    cur = []
+    cur_len = 0
+    for p in pieces:
+        if cur and cur_len + len(p) + 1 > max_chars:
+            chunks.append("\n".join(cur))
+            cur, cur_len = [], 0
+        cur.append(p)
+        cur_len += len(p) + 1
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+# =========================
+# Cache des digests (par hash de contenu)
+# =========================
+
+def content_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+class DigestCache:
+    """
+    Cache disque: <dir>/<hash>.json -> {"digest": ...}.
+    index.json associe une source stable (docId, fichier+mtime) au hash de son digest,
+    pour ne même pas relire le texte d'une transcription déjà digérée.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / "index.json"
+        self.index = json.loads(self.index_path.read_text(encoding="utf-8")) if self.index_path.exists() else {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> str | None:
+        p = self.dir / f"{key}.json"
+        if p.exists():
+            with self.lock:
+                self.hits += 1
+            return json.loads(p.read_text(encoding="utf-8"))["digest"]
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, digest: str) -> None:
+        p = self.dir / f"{key}.json"
+        tmp = p.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"digest": digest}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(p)
+
+    def lookup_source(self, source_key: str) -> str | None:
+        key = self.index.get(source_key)
+        return self.get(key) if key else None
+
+    def remember_source(self, source_key: str, key: str) -> None:
+        with self.lock:
+            self.index[source_key] = key
+            self.index_path.write_text(json.dumps(self.index, ensure_ascii=False, indent=1), encoding="utf-8")
+
+# =========================
+# Appel chat (retries comme transcribeAudio_)
+# =========================
+
+def make_chat(api_url: str, api_key: str, model: str, max_attempts: int = 4, backoff_ms: int = 1500,
+              timeout: float = 300.0, workers: int = 8) -> Callable[[str, str], str]:
+    """Retourne chat(system, user) -> contenu, sur une session HTTP partagée (keep-alive)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def chat(system: str, user: str) -> str:
+        payload = {
+            "model": model,
+            "temperature": 0.2,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+        }
+        for attempt in range(1, max_attempts + 1):
+            try:
+                r = session.post(api_url, json=payload, headers={"Authorization": f"Bearer {api_key}"}, timeout=timeout)
+            except requests.RequestException as e:
+                if attempt < max_attempts:
+                    time.sleep(compute_backoff_with_jitter(backoff_ms, attempt) / 1000.0)
+                    continue
+                raise RuntimeError(f"Erreur API synthèse : {e}")
+            if r.status_code == 200:
+                return r.json()["choices"][0]["message"]["content"]
+            if should_retry_status(r.status_code) and attempt < max_attempts:
+                delay = compute_backoff_with_jitter(backoff_ms, attempt)
+                print(f"[WARN] Chat: tentative {attempt}/{max_attempts} échouée (HTTP {r.status_code}). Retry dans {delay} ms.")
+                time.sleep(delay / 1000.0)
+                continue
+            raise RuntimeError(f"Erreur API synthèse : {r.text}")
+        raise RuntimeError("Erreur API synthèse : épuisement des retries")
+
+    return chat
+
+# =========================
+# Map / Reduce
+# =========================
+
+class MapReduceSummarizer:
+    """
+    Les fan-outs (chunks, documents, groupes de fusion) s'imbriquent: chacun a son propre pool,
+    et la concurrence réelle est bornée par un sémaphore autour de l'appel chat (workers).
+    """
+
+    def __init__(self, chat: Callable[[str, str], str], cache: DigestCache, model: str,
+                 chunk_tokens: int = 6000, reduce_tokens: int = 12000, workers: int = 8):
+        self.chat = chat
+        self.cache = cache
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.reduce_tokens = reduce_tokens
+        self.workers = max(1, workers)
+        self.slots = threading.Semaphore(self.workers)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def parallel(self, fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """map parallèle, ordre conservé."""
+        if len(items) <= 1:
+            return [fn(x) for x in items]
+        with ThreadPoolExecutor(max_workers=min(len(items), self.workers)) as pool:
+            return list(pool.map(fn, items))
+
+    def _cached_call(self, system: str, user: str) -> tuple[str, str]:
+        key = content_hash(self.model, system, user)
+        digest = self.cache.get(key)
+        if digest is None:
+            with self.slots:
+                digest = self.chat(system, user)
+            with self._lock:
+                self.calls += 1
+            self.cache.put(key, digest)
+        return key, digest
+
+    def map_digest(self, chunk: str) -> tuple[str, str]:
+        return self._cached_call(MAP_INSTRUCTION, chunk)
+
+    def reduce_digests(self, digests: List[str]) -> str:
+        """Fusionne des digests en un seul ; groupes en parallèle + récursion si le budget est dépassé."""
+        if len(digests) == 1:
+            return digests[0]
+        groups = self._group_by_budget(digests)
+        if len(groups) == 1:
+            return self._cached_call(REDUCE_INSTRUCTION, "\n\n---\n\n".join(digests))[1]
+        return self.reduce_digests(self.parallel(self.reduce_digests, groups))
+
+    def _group_by_budget(self, digests: List[str]) -> List[List[str]]:
+        groups, cur, cur_tok = [], [], 0
+        for d in digests:
+            t = approx_tokens(d)
+            if cur and cur_tok + t > self.reduce_tokens:
+                groups.append(cur)
+                cur, cur_tok = [], 0
+            cur.append(d)
+            cur_tok += t
+        if cur:
+            groups.append(cur)
+        # Garantit une progression de la récursion (au moins 2 éléments par groupe)
+        if len(groups) == len(digests):
+            groups = [digests[i:i + 2] for i in range(0, len(digests), 2)]
+        return groups
+
+    def digest_document(self, source: tuple[str, Callable[[], str]]) -> str:
+        """Digest d'une transcription: map sur ses chunks (parallèle) puis reduce. Caché par source et par contenu."""
+        source_key, load_text = source
+        cached = self.cache.lookup_source(source_key)
+        if cached is not None:
+            return cached
+        chunks = chunk_text(load_text(), self.chunk_tokens)
+        if not chunks:
+            # Transcription vide: digest vide, sans appel payant (mémorisé pour ne pas relire la source)
+            key = content_hash(self.model, MAP_INSTRUCTION, "")
+            self.cache.put(key, "")
+            self.cache.remember_source(source_key, key)
+            return ""
+        mapped = self.parallel(self.map_digest, chunks)
+        if len(mapped) == 1:
+            key, digest = mapped[0]
+        else:
+            digest = self.reduce_digests([d for _, d in mapped])
+            key = content_hash(self.model, REDUCE_INSTRUCTION, "\n\n---\n\n".join(d for _, d in mapped))
+            if self.cache.get(key) is None:  # fusion récursive: on mémorise le résultat final sous cette clé
+                self.cache.put(key, digest)
+        self.cache.remember_source(source_key, key)
+        return digest
+
+    def digest_documents(self, sources: List[tuple[str, Callable[[], str]]]) -> List[str]:
+        """Digests de plusieurs transcriptions en parallèle (ordre conservé, digests vides omis)."""
+        return [d for d in self.parallel(self.digest_document, sources) if d]
+
+    def final_summary(self, prompt: str, digests: List[str]) -> str:
+        """Étape finale: prompt du Doc + digests -> HTML (même consigne que summarizeAsHTMLFromDocs_)."""
+        if not digests:
+            raise RuntimeError("Aucun digest à résumer.")
+        if approx_tokens("".join(digests)) > self.reduce_tokens:
+            body = self.reduce_digests(digests)
+        else:
+            body = "\n\n".join(digests)
+        return self._cached_call(HTML_SYSTEM_INSTRUCTION, f"{prompt}\n\n{body}")[1]
+
+# =========================
+# Sources (fichiers locaux ou Docs via GAS)
+# =========================
+
+def file_source(path: Path) -> tuple[str, Callable[[], str]]:
+    st = path.stat()
+    return f"file:{path.resolve()}:{st.st_mtime_ns}:{st.st_size}", lambda: path.read_text(encoding="utf-8")
+
+def doc_source(gas: GasClient, doc_id: str) -> tuple[str, Callable[[], str]]:
+    # Les Docs de transcription ne sont plus modifiés après création: le docId suffit comme clé
+    return f"doc:{doc_id}", lambda: gas.fetch_doc_text(doc_id)
+
+def period_dates(period: str, end_date: date) -> List[date]:
+    """Dates couvertes (ordre chronologique), fin incluse."""
+    n = PERIOD_DAYS[period]
+    return [end_date - timedelta(days=i) for i in range(n - 1, -1, -1)]
+
+def transcripts_for_date(transcripts_dir: Path, d: date) -> List[Path]:
+    """Transcriptions nommées 'YYYY-MM-DD-HHmm__...' (cf. worker_queue.py), triées par nom."""
+    prefix = d.strftime("%Y-%m-%d")
+    return sorted(p for p in transcripts_dir.iterdir() if p.is_file() and p.name.startswith(prefix) and p.suffix == ".txt")
+
+def summarize_period(summarizer: MapReduceSummarizer, prompt: str, period: str, end_date: date,
+                     transcripts_dir: Path) -> str:
+    """
+    daily:   transcriptions du jour -> digests -> HTML
+    weekly:  digest par jour (caché) -> HTML
+    monthly: digest par jour (caché) -> digest par semaine ISO (caché) -> HTML
+    """
+    day_digests = []  # [(date, digest)]
+    for d in period_dates(period, end_date):
+        files = transcripts_for_date(transcripts_dir, d)
+        if not files:
+            continue
+        doc_digests = summarizer.digest_documents([file_source(p) for p in files])
+        if not doc_digests:
+            continue
+        if period == "daily":
+            day_digests.extend((d, dd) for dd in doc_digests)
+        else:
+            day_digests.append((d, f"[{d.isoformat()}]\n" + summarizer.reduce_digests(doc_digests)))
+
+    if period == "monthly":
+        # Semaines calendaires (ISO): mêmes frontières d'un mois à l'autre => digests de semaine réutilisés
+        weeks = {}
+        for d, dd in day_digests:
+            weeks.setdefault(d.isocalendar()[:2], []).append(dd)
+        return summarizer.final_summary(prompt, summarizer.parallel(summarizer.reduce_digests, list(weeks.values())))
+
+    return summarizer.final_summary(prompt, [dd for _, dd in day_digests])
+
+def summary_doc_name(period: str, end_date: date) -> str:
+    """Mêmes titres que main.gs."""
+    if period == "daily":
+        return f"{end_date.isoformat()} - Daily Summary"
+    if period == "weekly":
+        return f"{end_date.isoformat()} - Weekly Summary (7d)"
+    return f"{end_date.strftime('%Y-%m')} - Monthly Summary"
+
+# =========================
+# Main
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Résumés Daily/Weekly/Monthly en map-reduce avec cache de digests")
+    parser.add_argument("--period", choices=list(PERIOD_DAYS), default="daily")
+    parser.add_argument("--end_date", default=None, help="YYYY-MM-DD (défaut: hier)")
+    parser.add_argument("--transcripts_dir", help="Dossier des transcriptions 'YYYY-MM-DD-HHmm__*.txt'")
+    parser.add_argument("--doc_ids", nargs="*", default=None, help="Docs de transcription à résumer (via --gas_url)")
+    parser.add_argument("--gas_url", default=os.environ.get("GAS_URL"))
+    parser.add_argument("--prompt_file", default=None)
+    parser.add_argument("--prompt_doc_id", default=None)
+    parser.add_argument("--cache_dir", default=".digest_cache")
+    parser.add_argument("--out_dir", default="summaries_out")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--api_url", default=OPENAI_CHAT_API_URL, help="Endpoint chat/completions (compatible OpenAI)")
+    parser.add_argument("--chunk_tokens", type=int, default=6000, help="Budget (approx.) d'un chunk de transcription")
+    parser.add_argument("--reduce_tokens", type=int, default=12000, help="Budget (approx.) d'un appel de fusion")
+    parser.add_argument("--workers", type=int, default=8, help="Appels chat concurrents max")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY manquant.")
+
+    gas = GasClient(prompt_url=args.gas_url, pool_size=args.workers)
+    if args.prompt_file:
+        prompt = Path(args.prompt_file).read_text(encoding="utf-8").strip()
+    elif args.prompt_doc_id and args.gas_url:
+        prompt = gas.fetch_prompt(args.prompt_doc_id)
+    else:
+        parser.error("--prompt_file ou --prompt_doc_id (+ --gas_url) requis")
+
+    end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date else date.today() - timedelta(days=1)
+    cache = DigestCache(args.cache_dir)
+    chat = make_chat(args.api_url, api_key, args.model, workers=args.workers)
+    summarizer = MapReduceSummarizer(chat, cache, args.model, chunk_tokens=args.chunk_tokens,
+                                     reduce_tokens=args.reduce_tokens, workers=args.workers)
+
+    t0 = time.time()
+    if args.doc_ids:
+        if not args.gas_url:
+            parser.error("--doc_ids requiert --gas_url")
+        digests = summarizer.digest_documents([doc_source(gas, d) for d in args.doc_ids])
+        html = summarizer.final_summary(prompt, digests)
+    elif args.transcripts_dir:
+        html = summarize_period(summarizer, prompt, args.period, end_date, Path(args.transcripts_dir))
+    else:
+        parser.error("--transcripts_dir ou --doc_ids requis")
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{summary_doc_name(args.period, end_date)}.html"
+    out_path.write_text(html, encoding="utf-8")
+
+    print(f"[INFO] Appels chat: {summarizer.calls} | cache hits: {cache.hits} | misses: {cache.misses} "
+          f"| {time.time() - t0:.1f}s")
+    print(f"[INFO] Résumé: {out_path}")
+
+if __name__ == "__main__":
+    main()
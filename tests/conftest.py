@@ -0,0 +1,80 @@
+import sys
+import json
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class StubServer:
+    """
+    Serveur HTTP local: `responses` est une liste de (status, body) servie dans l'ordre
+    (la dernière est répétée), ou une fonction (request) -> (status, body).
+    Chaque requête est enregistrée: {"method", "path", "query", "body", "headers"}.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                url = urlparse(self.path)
+                req = {
+                    "method": self.command,
+                    "path": url.path,
+                    "query": {k: v[0] for k, v in parse_qs(url.query).items()},
+                    "body": self.rfile.read(length) if length else b"",
+                    "headers": dict(self.headers),
+                }
+                status, body = stub._next(req)
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body)
+                data = body.encode("utf-8") if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def _next(self, req):
+        with self._lock:
+            self.requests.append(req)
+            if callable(self.responses):
+                return self.responses(req)
+            idx = min(len(self.requests), len(self.responses)) - 1
+            return self.responses[idx]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(responses):
+        s = StubServer(responses)
+        servers.append(s)
+        return s
+
+    yield start
+    for s in servers:
+        s.close()
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from audio_codecs import build_chapters, get_codec, locate_in_sources, write_chapters_sidecar, write_ffmetadata
+
+
+CLIPS = [
+    {"file": "/tmp/zip/matin.mp3", "start": 12.0, "end": 20.5, "label": "Café", "score": 4.5},
+    {"file": "/tmp/zip/soir.mp3", "start": 3.0, "end": 5.0, "score": 3.0},
+    {"start": 7.0, "end": 6.0},
+]
+
+
+def test_build_chapters_offsets_and_provenance():
+    chapters = build_chapters(CLIPS)
+
+    assert [(c["offset"], c["duration"]) for c in chapters] == [(0.0, 8.5), (8.5, 2.0), (10.5, 0.0)]
+    assert chapters[0] == {"offset": 0.0, "duration": 8.5, "file": "matin.mp3", "start": 12.0, "end": 20.5,
+                           "label": "Café", "score": 4.5}
+    assert chapters[1]["label"] == "" and chapters[2]["file"] == ""
+
+
+def test_build_chapters_uses_source_timestamps():
+    clip = {"file": "b.mp3", "start": 130.0, "end": 135.0, "src_start": 10.0, "src_end": 15.0}
+    assert build_chapters([clip])[0]["start"] == 10.0
+    assert build_chapters([clip])[0]["end"] == 15.0
+
+
+def test_locate_in_sources():
+    file_map = [{"file": "a.mp3", "start": 0.0, "end": 100.0},
+                {"file": "b.mp3", "start": 110.0, "end": 200.0}]
+    clips = [{"start": 120.0, "end": 130.0}, {"start": 95.0, "end": 105.0}, {"start": 105.0, "end": 108.0}]
+
+    located = locate_in_sources(clips, file_map)
+
+    assert located[0] == {"start": 120.0, "end": 130.0, "file": "b.mp3", "src_start": 10.0, "src_end": 20.0}
+    # Fin bornée à la fin du fichier source
+    assert (located[1]["file"], located[1]["src_start"], located[1]["src_end"]) == ("a.mp3", 95.0, 100.0)
+    # Dans le silence entre deux fichiers: inchangé
+    assert located[2] == clips[2] and located[2] is not clips[2]
+
+
+def test_write_ffmetadata_escapes_titles(tmp_path):
+    chapters = build_chapters([
+        {"start": 0.0, "end": 1.5, "label": "a=b; c#d\\e\nf"},
+        {"file": "x.mp3", "start": 2.0, "end": 3.25},
+    ])
+
+    text = write_ffmetadata(chapters, tmp_path / "chapters.ffmeta").read_text(encoding="utf-8")
+
+    assert text == (";FFMETADATA1\n"
+                    "[CHAPTER]\nTIMEBASE=1/1000\nSTART=0\nEND=1500\ntitle=a\\=b\\; c\\#d\\\\e\\\nf\n"
+                    "[CHAPTER]\nTIMEBASE=1/1000\nSTART=1500\nEND=2750\ntitle=x.mp3 @ 2.0s\n")
+
+
+def test_write_chapters_sidecar(tmp_path):
+    sidecar = tmp_path / "chapters.json"
+    write_chapters_sidecar(build_chapters(CLIPS[:1]), str(tmp_path / "out" / "bestof.opus"), "opus-32", str(sidecar))
+
+    data = json.loads(sidecar.read_text(encoding="utf-8"))
+    assert data["audio"] == "bestof.opus"
+    assert data["codec"] == "opus-32" and data["mimeType"] == "audio/ogg"
+    assert data["chapters"][0]["label"] == "Café"
+
+
+def test_get_codec_unknown():
+    assert get_codec("mp3")["mime"] == "audio/mpeg"
+    with pytest.raises(ValueError, match="flac"):
+        get_codec("flac")
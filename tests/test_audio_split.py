@@ -0,0 +1,123 @@
+import pytest
+from pathlib import Path
+
+import audio_split
+from audio_split import merge_overlapping_text, plan_chunks, split_on_silence, stitch_texts, \
+    stitch_word_segments
+
+
+def fake_export(calls):
+    def export(path, chunks, out_dir=None, bitrate="64k"):
+        calls.append(chunks)
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        files = []
+        for i, _ in enumerate(chunks):
+            f = out / f"chunk_{i:04d}.mp3"
+            f.write_bytes(b"ID3")
+            files.append(f)
+        return files
+    return export
+
+
+def test_short_small_file_is_returned_as_is(tmp_path, monkeypatch):
+    src = tmp_path / "a.wav"
+    src.write_bytes(b"\0" * 1000)
+    calls = []
+    monkeypatch.setattr(audio_split, "probe_duration", lambda p: 180.0)
+    monkeypatch.setattr(audio_split, "export_chunks", fake_export(calls))
+
+    chunks = split_on_silence(str(src), max_chunk_sec=600, out_dir=str(tmp_path / "c"), max_bytes=2000)
+
+    assert [c["path"] for c in chunks] == [src]
+    assert calls == []
+
+
+def test_short_oversized_file_is_reencoded(tmp_path, monkeypatch):
+    src = tmp_path / "a.wav"
+    src.write_bytes(b"\0" * 5000)
+    calls = []
+    monkeypatch.setattr(audio_split, "probe_duration", lambda p: 180.0)
+    monkeypatch.setattr(audio_split, "detect_silences", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    monkeypatch.setattr(audio_split, "export_chunks", fake_export(calls))
+
+    chunks = split_on_silence(str(src), max_chunk_sec=600, out_dir=str(tmp_path / "c"), max_bytes=2000)
+
+    assert len(chunks) == 1
+    assert chunks[0]["path"] == tmp_path / "c" / "chunk_0000.mp3"
+    assert (chunks[0]["start"], chunks[0]["end"], chunks[0]["keep_end"]) == (0.0, 180.0, 180.0)
+    assert calls == [[{"start": 0.0, "end": 180.0, "keep_start": 0.0, "keep_end": 180.0}]]
+
+
+# ---------- plan_chunks ----------
+
+def spans(chunks):
+    return [(c["keep_start"], c["keep_end"]) for c in chunks]
+
+
+def test_plan_chunks_cuts_at_latest_silence_midpoint():
+    chunks = plan_chunks(2000.0, [(500.0, 510.0), (570.0, 590.0)], max_chunk_sec=600, overlap_sec=1.0)
+    assert spans(chunks)[0] == (0.0, 580.0)
+    assert chunks[1]["start"] == 579.0 and chunks[0]["end"] == 581.0
+    assert chunks[0]["start"] == 0.0 and chunks[-1]["end"] == 2000.0
+
+
+def test_plan_chunks_hard_cut_without_silence():
+    assert spans(plan_chunks(2000.0, [], max_chunk_sec=600)) == [
+        (0.0, 600.0), (600.0, 1200.0), (1200.0, 1600.0), (1600.0, 2000.0)]
+    # Silence trop tôt (< min_chunk_sec) ignoré
+    assert spans(plan_chunks(1500.0, [(10.0, 20.0)], max_chunk_sec=600))[0] == (0.0, 600.0)
+
+
+def test_plan_chunks_balances_the_tail():
+    # Avant: 591 / 600 / 9 s
+    assert spans(plan_chunks(1200.0, [(590.0, 592.0)], max_chunk_sec=600)) == [(0.0, 600.0), (600.0, 1200.0)]
+    # Dernière coupe: silence le plus proche du milieu, pas le plus tardif
+    assert spans(plan_chunks(1000.0, [(440.0, 460.0), (580.0, 600.0)], max_chunk_sec=600)) == [
+        (0.0, 450.0), (450.0, 1000.0)]
+
+
+def test_plan_chunks_short_file_is_one_chunk():
+    assert plan_chunks(300.0, [(100.0, 110.0)], max_chunk_sec=600) == [
+        {"start": 0.0, "end": 300.0, "keep_start": 0.0, "keep_end": 300.0}]
+
+
+# ---------- recollage ----------
+
+def test_stitch_word_segments_keeps_overlap_word_once():
+    chunks = plan_chunks(1200.0, [(599.0, 601.0)], max_chunk_sec=600, overlap_sec=2.0)
+    assert spans(chunks) == [(0.0, 600.0), (600.0, 1200.0)]
+    assert chunks[1]["start"] == 598.0
+    # "frontière" [598.5, 599.3] (milieu 598.9 < 600) est vu par les deux morceaux
+    first = [{"word": "avant", "start": 590.0, "end": 590.5}, {"word": "frontière", "start": 598.5, "end": 599.3},
+             {"word": "après", "start": 600.5, "end": 601.0}]
+    second = [{"word": "frontière", "start": 0.5, "end": 1.3}, {"word": "après", "start": 2.5, "end": 3.0},
+              {"word": "sans_ts"}, {"word": "fin", "start": 10.0, "end": 10.5}]
+
+    words = stitch_word_segments(chunks, [first, second])
+
+    assert [w["word"] for w in words] == ["avant", "frontière", "après", "fin"]
+    assert [w["start"] for w in words] == [590.0, 598.5, 600.5, 608.0]
+
+
+def test_stitch_word_segments_last_chunk_keeps_final_word():
+    chunks = plan_chunks(100.0, [], max_chunk_sec=600)
+    words = stitch_word_segments(chunks, [[{"word": "fin", "start": 99.8, "end": 100.4}]])
+    assert [w["word"] for w in words] == ["fin"]
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("on se voit demain à la gare", "À la gare, vers midi", "on se voit demain à la gare vers midi"),
+    ("bonjour tout le monde", "merci beaucoup", "bonjour tout le monde merci beaucoup"),
+    # Un seul mot commun (< min_match): pas de dédoublonnage
+    ("il pleut", "pleut encore", "il pleut pleut encore"),
+    ("", "  seul  ", "seul"),
+    ("seul", "", "seul"),
+])
+def test_merge_overlapping_text(a, b, expected):
+    assert merge_overlapping_text(a, b) == expected
+
+
+def test_stitch_texts():
+    assert stitch_texts(["un deux trois quatre", "trois quatre cinq six", None, "cinq six sept"]) == \
+        "un deux trois quatre cinq six sept"
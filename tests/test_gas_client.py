@@ -0,0 +1,190 @@
+import json
+import base64
+
+import pytest
+
+import gas_client
+from gas_client import GasClient, process_dates
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(gas_client, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+
+
+def client_for(stub, tmp_path, **kwargs):
+    return GasClient(base_url=stub.url, token="tok", prompt_url=stub.url,
+                     cache_dir=str(tmp_path / "cache"), **kwargs)
+
+
+# ---------- retries ----------
+
+def test_status_retries_on_429_and_5xx(stub_server, tmp_path):
+    stub = stub_server([(429, "slow"), (503, "busy"), (200, {"hasInput": True, "hasBestof": False})])
+
+    assert client_for(stub, tmp_path).status("2025-08-18") == {"hasInput": True, "hasBestof": False}
+    assert len(stub.requests) == 3
+    assert stub.requests[-1]["query"] == {"action": "status", "token": "tok", "date": "2025-08-18"}
+
+
+def test_status_does_not_retry_client_errors(stub_server, tmp_path):
+    stub = stub_server([(403, "forbidden")])
+
+    with pytest.raises(Exception):
+        client_for(stub, tmp_path).status("2025-08-18")
+    assert len(stub.requests) == 1
+
+
+# ---------- prompt cache ----------
+
+def test_prompt_cache_hit_within_ttl(stub_server, tmp_path):
+    stub = stub_server([(200, "  Consignes v1  ")])
+    client = client_for(stub, tmp_path)
+
+    assert client.fetch_prompt("doc1") == "Consignes v1"
+    assert client.fetch_prompt("doc1") == "Consignes v1"
+    # Un autre client (nouveau process) relit le cache disque
+    assert client_for(stub, tmp_path).fetch_prompt("doc1") == "Consignes v1"
+    assert len(stub.requests) == 1
+    assert stub.requests[0]["query"] == {"docId": "doc1"}
+
+
+def test_prompt_refreshed_after_ttl(stub_server, tmp_path):
+    stub = stub_server([(200, "v1"), (200, "v2")])
+    client = client_for(stub, tmp_path)
+
+    assert client.fetch_prompt("doc1") == "v1"
+    assert client.fetch_prompt("doc1", max_age=0) == "v2"
+    assert len(stub.requests) == 2
+
+
+def test_prompt_falls_back_to_cache_when_refresh_fails(stub_server, tmp_path):
+    stub = stub_server([(200, "v1"), (500, "down")])
+    client = client_for(stub, tmp_path, max_attempts=2)
+
+    assert client.fetch_prompt("doc1") == "v1"
+    assert client.fetch_prompt("doc1", max_age=0) == "v1"
+    assert len(stub.requests) == 3
+
+
+def test_prompt_without_cache_raises_when_down(stub_server, tmp_path):
+    stub = stub_server([(500, "down")])
+
+    with pytest.raises(Exception):
+        client_for(stub, tmp_path, max_attempts=2).fetch_prompt("doc1")
+
+
+# ---------- pending / zip ----------
+
+STATUSES = {
+    "2025-08-15": {"hasInput": True, "hasBestof": False},
+    "2025-08-16": {"hasInput": True, "hasBestof": True},
+    "2025-08-17": {"hasInput": False, "hasBestof": False},
+    "2025-08-18": {"hasInput": True, "hasBestof": False},
+}
+
+
+def test_pending_dates_filters_and_keeps_order(stub_server, tmp_path):
+    stub = stub_server(lambda req: (200, STATUSES[req["query"]["date"]]))
+
+    assert client_for(stub, tmp_path).pending_dates(list(STATUSES)) == ["2025-08-15", "2025-08-18"]
+    assert len(stub.requests) == 4
+
+
+def test_pending_dates_fails_loudly_when_gas_is_down(stub_server, tmp_path):
+    stub = stub_server([(500, "down")])
+
+    with pytest.raises(RuntimeError, match="2025-08-18"):
+        client_for(stub, tmp_path, max_attempts=2).pending_dates(["2025-08-18"])
+
+
+def test_pending_cli_exits_non_zero_when_gas_is_down(stub_server, tmp_path, monkeypatch, capsys):
+    stub = stub_server([(500, "down")])
+    monkeypatch.setattr("sys.argv", ["gas_client.py", "--base_url", stub.url, "--token", "tok",
+                                     "--cache_dir", str(tmp_path), "pending", "2025-08-18"])
+
+    with pytest.raises(RuntimeError):
+        gas_client.main()
+    assert capsys.readouterr().out == ""
+
+
+def test_zip_file_id(stub_server, tmp_path):
+    stub = stub_server(lambda req: {
+        "2025-08-18": (200, {"id": "abc"}),
+        "2025-08-17": (200, {}),
+        "2025-08-16": (200, "<html>not json</html>"),
+        "2025-08-15": (502, "bad gateway"),
+    }[req["query"]["date"]])
+    client = client_for(stub, tmp_path, max_attempts=2)
+
+    assert client.zip_file_id("2025-08-18") == "abc"
+    assert client.zip_file_id("2025-08-17") is None
+    assert client.zip_file_id("2025-08-16") is None
+    assert client.zip_file_id("2025-08-15") is None
+
+
+# ---------- upload ----------
+
+@pytest.mark.parametrize("name, mime", [
+    ("bestof.mp3", "audio/mpeg"),
+    ("bestof.opus", "audio/ogg"),
+    ("bestof.m4a", "audio/mp4"),
+])
+def test_upload_bestof_payload(stub_server, tmp_path, name, mime):
+    stub = stub_server([(200, {"ok": True})])
+    path = tmp_path / name
+    path.write_bytes(b"\x00\xffbinary\r\n")
+
+    assert client_for(stub, tmp_path).upload_bestof("2025-08-18", str(path)) == {"ok": True}
+    req = stub.requests[0]
+    assert req["method"] == "POST"
+    assert req["query"] == {"action": "uploadBestof", "token": "tok", "date": "2025-08-18"}
+    assert req["headers"]["Content-Type"] == "application/json"
+    payload = json.loads(req["body"])
+    assert payload["filename"] == f"bestof_2025-08-18{path.suffix}"
+    assert payload["mimeType"] == mime
+    assert base64.b64decode(payload["data"]) == b"\x00\xffbinary\r\n"
+
+
+# ---------- process (une session pour tout le pipeline) ----------
+
+def test_process_dates_runs_pipeline_on_one_client(stub_server, tmp_path):
+    def handler(req):
+        action = req["query"]["action"]
+        date = req["query"].get("date")
+        if action == "status":
+            return 200, STATUSES[date]
+        if action == "zip":
+            return (200, {"id": "zip-15"}) if date == "2025-08-15" else (200, {})
+        return 200, {"ok": True}
+
+    stub = stub_server(handler)
+    commands = []
+
+    def fake_run(cmd, check):
+        commands.append(cmd)
+        if cmd[0] != "gdown":
+            out_dir = tmp_path / "out_2025-08-15"
+            out_dir.mkdir()
+            (out_dir / "bestof.opus").write_bytes(b"OggS")
+            (out_dir / "chapters.json").write_text(json.dumps({"audio": "bestof.opus"}))
+
+    done = process_dates(client_for(stub, tmp_path), list(STATUSES), ["--keep_pct", "20"],
+                         skip_missing_zip=True, work_dir=str(tmp_path), run=fake_run)
+
+    assert done == ["2025-08-15"]
+    assert commands[0] == ["gdown", "zip-15", "-O", str(tmp_path / "audios_2025-08-15.zip")]
+    assert commands[1][-4:] == ["--out_dir", str(tmp_path / "out_2025-08-15"), "--keep_pct", "20"]
+    actions = [(r["query"]["action"], r["query"].get("date")) for r in stub.requests[4:]]
+    assert actions == [("zip", "2025-08-15"), ("uploadBestof", "2025-08-15"), ("archive", "2025-08-15"),
+                       ("zip", "2025-08-18")]
+    assert json.loads(stub.requests[5]["body"])["filename"] == "bestof_2025-08-15.opus"
+
+
+def test_process_dates_missing_zip_fails_daily(stub_server, tmp_path):
+    stub = stub_server(lambda req: (200, STATUSES["2025-08-18"]) if req["query"]["action"] == "status"
+                       else (200, {}))
+
+    with pytest.raises(RuntimeError, match="Pas de ZIP"):
+        process_dates(client_for(stub, tmp_path), ["2025-08-18"], [], work_dir=str(tmp_path),
+                      run=lambda cmd, check: pytest.fail("ne doit rien lancer"))
@@ -0,0 +1,182 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+import gpt_scoring
+from gpt_scoring import (
+    COMPACT_SCORE_SCHEMA, _chat_json, _is_response_format_error, openai_score_segments_compact,
+    parse_compact_pairs, score_all_segments_with_gpt,
+)
+from openai import BadRequestError
+
+
+def bad_request(message, param=None):
+    # Construit sans réponse HTTP (indépendant de la version du client httpx)
+    e = BadRequestError.__new__(BadRequestError)
+    Exception.__init__(e, message)
+    e.message, e.param = message, param
+    return e
+
+
+class FakeClient:
+    """Client OpenAI factice: `replies` = contenus (str) ou exceptions, servis dans l'ordre."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10,
+                                  prompt_tokens_details=SimpleNamespace(cached_tokens=64)),
+        )
+
+    def formats(self):
+        return [c["response_format"]["type"] for c in self.calls]
+
+    def payload(self, idx):
+        return json.loads(self.calls[idx]["messages"][-1]["content"])
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    monkeypatch.setattr(gpt_scoring, "_json_schema_unsupported", set())
+
+    def install(replies):
+        client = FakeClient(replies)
+        monkeypatch.setattr(gpt_scoring, "get_openai_client", lambda: client)
+        return client
+
+    return install
+
+
+SEGMENTS = [{"i": 10 + k, "start": float(k), "end": k + 1.0, "text": f"segment {k}"} for k in range(3)]
+
+
+# ---------- parse_compact_pairs ----------
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"s": [[0, 4], [1, 2.5], [2, 1]]}', {0: 4, 1: 2.5, 2: 1}),
+    # Hors plage, négatif, doublon (premier gardé)
+    ('{"s": [[3, 5], [-1, 5], [0, 4], [0, 1]]}', {0: 4}),
+    # Indices float: entiers acceptés, le reste ignoré
+    ('{"s": [[1.0, 3], [1.5, 2], ["2", 1]]}', {1: 3, 2: 1}),
+    # Infinity / NaN (acceptés par json.loads) en indice
+    ('{"s": [[Infinity, 5], [NaN, 5], [-Infinity, 5], [2, 1]]}', {2: 1}),
+    # Lignes dict et clé "scores" du format historique
+    ('{"scores": [{"i": 0, "score": 3}, {"k": 1, "score": 2}, {"i": 2, "label": "Café"}]}',
+     {0: 3, 1: 2, 2: "Café"}),
+    # Lignes incomplètes, valeurs nulles, liste au premier niveau
+    ('[[0], [1, null], "x", [2, 4]]', {2: 4}),
+    ('pas du json', {}),
+    ('{"s": "oops"}', {}),
+])
+def test_parse_compact_pairs(content, expected):
+    assert parse_compact_pairs(content, "s", 3) == expected
+
+
+# ---------- _is_response_format_error ----------
+
+@pytest.mark.parametrize("message, param, expected", [
+    ("Invalid parameter: 'response_format' of type 'json_schema' is not supported with this model.",
+     "response_format", True),
+    ("Invalid schema for json_schema 'segment_scores'", None, True),
+    ("This model's maximum context length is 128000 tokens.", "messages", False),
+    ("Invalid value for 'temperature'", "temperature", False),
+])
+def test_is_response_format_error(message, param, expected):
+    assert _is_response_format_error(bad_request(message, param)) is expected
+
+
+# ---------- _chat_json: repli json_object mémorisé ----------
+
+def test_chat_json_falls_back_once_and_remembers(fake_client):
+    client = fake_client([bad_request("response_format json_schema not supported", "response_format"),
+                          '{"s": []}', '{"s": []}'])
+    stats = []
+
+    assert _chat_json("m", [], COMPACT_SCORE_SCHEMA, stats, "compact") == '{"s": []}'
+    assert _chat_json("m", [], COMPACT_SCORE_SCHEMA, stats, "compact") == '{"s": []}'
+
+    # Schéma tenté une seule fois, puis json_object directement
+    assert client.formats() == ["json_schema", "json_object", "json_object"]
+    assert gpt_scoring._json_schema_unsupported == {"m"}
+    assert [(s["kind"], s["prompt_tokens"], s["cached_tokens"]) for s in stats] == [("compact", 100, 64)] * 2
+
+
+def test_chat_json_fallback_is_per_model(fake_client):
+    client = fake_client([bad_request("json_schema unsupported", "response_format"), "{}", "{}"])
+
+    _chat_json("old-model", [], COMPACT_SCORE_SCHEMA, None, "compact")
+    _chat_json("new-model", [], COMPACT_SCORE_SCHEMA, None, "compact")
+
+    assert client.formats() == ["json_schema", "json_object", "json_schema"]
+
+
+def test_chat_json_other_bad_requests_are_raised(fake_client):
+    client = fake_client([bad_request("maximum context length exceeded", "messages")])
+
+    with pytest.raises(BadRequestError):
+        _chat_json("m", [], COMPACT_SCORE_SCHEMA, None, "compact")
+    assert len(client.calls) == 1
+    assert gpt_scoring._json_schema_unsupported == set()
+
+
+def test_chat_json_object_errors_are_not_retried(fake_client):
+    client = fake_client([bad_request("response_format json_object invalid", "response_format")])
+
+    with pytest.raises(BadRequestError):
+        _chat_json("m", [], {"type": "json_object"}, None, "labels")
+    assert len(client.calls) == 1
+
+
+# ---------- openai_score_segments_compact ----------
+
+def test_compact_repairs_missing_indices_once(fake_client):
+    # 1re réponse: k=1 manquant, k=2 NaN, k=7 hors plage ; réparation: on redemande [1, 2] (k locaux 0, 1)
+    client = fake_client(['{"s": [[0, 4], [2, NaN], [7, 5]]}', '{"s": [[0, 3], [1, 2]]}'])
+
+    scores = openai_score_segments_compact(SEGMENTS, "m", "consignes")
+
+    assert scores == [{"i": 10, "score": 4.0}, {"i": 11, "score": 3.0}, {"i": 12, "score": 2.0}]
+    assert len(client.calls) == 2
+    assert client.payload(0) == [[0, "segment 0"], [1, "segment 1"], [2, "segment 2"]]
+    assert client.payload(1) == [[0, "segment 1"], [1, "segment 2"]]
+
+
+def test_compact_repair_is_not_recursive(fake_client):
+    client = fake_client(['{"s": [[0, 4]]}', '{"s": [[0, Infinity]]}'])
+
+    scores = openai_score_segments_compact(SEGMENTS, "m", "consignes")
+
+    assert scores == [{"i": 10, "score": 4.0}, {"i": 11, "score": None}, {"i": 12, "score": None}]
+    assert len(client.calls) == 2
+
+
+def test_score_all_marks_unscored_segments_missing(fake_client):
+    fake_client(['{"s": [[0, 4], [1, "n/a"], [2, 1e999]]}', '{"s": []}'])
+
+    scored = score_all_segments_with_gpt(SEGMENTS, "m", "consignes")
+
+    assert [(s["i"], s["score"], s["source"]) for s in scored] == [
+        (10, 4.0, "gpt"), (11, 0.0, "missing"), (12, 0.0, "missing")]
+
+
+def test_score_all_legacy_rejects_non_finite(fake_client):
+    client = fake_client(['{"scores": [{"i": 10, "score": 5, "label": "a"}, {"i": 11, "score": NaN},'
+                          ' {"i": 12, "score": Infinity}]}'])
+
+    scored = score_all_segments_with_gpt(SEGMENTS, "m", "consignes", protocol="legacy")
+
+    assert [(s["score"], s["label"], s["source"]) for s in scored] == [
+        (5.0, "a", "gpt"), (0.0, "", "missing"), (0.0, "", "missing")]
+    assert client.formats() == ["json_object"]
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from local_scorer import LocalScorer, agreement, append_score_store, load_score_store, train_with_holdout
+
+
+def test_load_score_store_rescored_text_moves_to_latest_position(tmp_path):
+    store = tmp_path / "store.jsonl"
+    append_score_store(str(store), [{"text": "a", "score": 1}, {"text": "b", "score": 2}, {"text": "c", "score": 3}])
+    append_score_store(str(store), [{"text": "a", "score": 5}])
+    with open(store, "a", encoding="utf-8") as f:
+        f.write("pas du json\n\n" + json.dumps({"text": "d"}) + "\n")
+
+    texts, scores = load_score_store(str(store))
+
+    assert texts == ["b", "c", "a"]
+    assert scores.tolist() == [2.0, 3.0, 5.0]
+
+
+def test_train_predict_roundtrip(tmp_path):
+    good, bad = "anecdote drôle incroyable", "euh bon voilà"
+    texts = [f"{good if i % 2 else bad} numéro {i}" for i in range(200)]
+    scores = np.array([4.0 if i % 2 else 1.0 for i in range(200)])
+
+    model, metrics = train_with_holdout(texts, scores, holdout=0.2)
+    assert metrics["n"] == 40 and metrics["pearson"] > 0.9
+
+    path = tmp_path / "m.npz"
+    model.save(str(path))
+    loaded = LocalScorer.load(str(path))
+    pred, coverage = loaded.predict([f"{good} nouveau", f"{bad} nouveau", "zzz qqq"], return_coverage=True)
+    assert pred[0] > 3.0 and pred[1] < 2.0
+    assert coverage[2] == 0.0
+    assert loaded.score_min <= pred.min() and pred.max() <= loaded.score_max
+
+
+def test_uncertain_prefers_threshold_and_unknown_vocabulary():
+    model = LocalScorer()
+    model.rmse = 0.5
+    pred = np.array([0.0, 1.0, 2.9, 3.0, 3.1, 5.0, 0.5])
+    coverage = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.0])
+
+    idx = model.uncertain(pred, coverage, keep_frac=0.5, max_frac=1.0)
+    assert set(idx.tolist()) == {2, 3, 4, 6}
+    assert len(model.uncertain(pred, coverage, keep_frac=0.5, max_frac=0.3)) == 3
+
+
+def test_agreement_perfect():
+    m = agreement(np.array([1.0, 2.0, 3.0, 4.0, 5.0]), np.array([1.0, 2.0, 3.0, 4.0, 5.0]), keep_frac=0.4)
+    assert m["mae"] == 0.0 and m["pearson"] == pytest.approx(1.0) and m["top40_overlap"] == 1.0
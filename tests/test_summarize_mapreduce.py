@@ -0,0 +1,161 @@
+import os
+import threading
+from datetime import date, datetime
+
+import pytest
+
+import summarize_mapreduce
+from summarize_mapreduce import (
+    MAP_INSTRUCTION, REDUCE_INSTRUCTION, HTML_SYSTEM_INSTRUCTION,
+    DigestCache, MapReduceSummarizer, chunk_text, file_source, make_chat, summarize_period,
+)
+
+
+class FakeChat:
+    """Endpoint chat factice: enregistre (system, user) et renvoie un digest déterministe."""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, system, user):
+        with self.lock:
+            self.calls.append((system, user))
+        kind = {MAP_INSTRUCTION: "map", REDUCE_INSTRUCTION: "reduce", HTML_SYSTEM_INSTRUCTION: "html"}[system]
+        return f"{kind}<{user[:40]}>"
+
+    def kinds(self):
+        return [{MAP_INSTRUCTION: "map", REDUCE_INSTRUCTION: "reduce", HTML_SYSTEM_INSTRUCTION: "html"}[s]
+                for s, _ in self.calls]
+
+
+def make_summarizer(cache_dir, chat, **kwargs):
+    return MapReduceSummarizer(chat, DigestCache(str(cache_dir)), "gpt-test", workers=4, **kwargs)
+
+
+def write_transcript(transcripts_dir, d, hhmm, text):
+    p = transcripts_dir / f"{d.isoformat()}-{hhmm}__memo.mp3.txt"
+    p.write_text(text, encoding="utf-8")
+    ts = datetime(d.year, d.month, d.day, 12).timestamp()
+    os.utime(p, (ts, ts))
+    return p
+
+
+# ---------- chunk_text ----------
+
+def test_chunk_text_respects_budget():
+    text = "\n".join(f"Ligne {i} " + "x" * 50 for i in range(200))
+    chunks = chunk_text(text, budget_tokens=100)  # 400 caractères max
+    assert len(chunks) > 1
+    assert all(len(c) <= 400 for c in chunks)
+    assert "\n".join(chunks).split("\n") == text.split("\n")
+
+
+def test_chunk_text_splits_long_paragraph_by_sentence_then_hard_cut():
+    para = "Phrase courte. " * 30 + "y" * 1000
+    chunks = chunk_text(para, budget_tokens=50)  # 200 caractères max
+    assert all(len(c) <= 200 for c in chunks)
+    assert "".join(chunks).replace("\n", " ").count("y") == 1000
+
+
+def test_chunk_text_small_and_empty():
+    assert chunk_text("Bonjour.\n\nAu revoir.", budget_tokens=100) == ["Bonjour.\nAu revoir."]
+    assert chunk_text("  \n\n ", budget_tokens=100) == []
+
+
+# ---------- Map / reduce + cache ----------
+
+def test_digest_document_second_run_makes_no_call(tmp_path):
+    src = tmp_path / "t.txt"
+    src.write_text("\n".join(f"Sujet {i}: " + "z" * 80 for i in range(40)), encoding="utf-8")
+
+    chat = FakeChat()
+    first = make_summarizer(tmp_path / "cache", chat, chunk_tokens=200, reduce_tokens=100000)
+    digest = first.digest_document(file_source(src))
+    assert first.calls == len(chat.calls) > 1
+    assert chat.kinds().count("reduce") == 1
+
+    # Nouveau run (nouvel objet, même dossier de cache): aucun appel
+    chat2 = FakeChat()
+    second = make_summarizer(tmp_path / "cache", chat2, chunk_tokens=200, reduce_tokens=100000)
+    assert second.digest_document(file_source(src)) == digest
+    assert chat2.calls == [] and second.calls == 0
+
+
+def test_empty_transcript_makes_no_call_and_is_dropped(tmp_path):
+    empty = tmp_path / "empty.txt"
+    empty.write_text("   \n\n", encoding="utf-8")
+    full = tmp_path / "full.txt"
+    full.write_text("Réunion avec Paul.", encoding="utf-8")
+
+    chat = FakeChat()
+    s = make_summarizer(tmp_path / "cache", chat)
+    assert s.digest_document(file_source(empty)) == ""
+    assert chat.calls == []
+    assert s.digest_documents([file_source(empty), file_source(full)]) == ["map<Réunion avec Paul.>"]
+
+
+def test_weekly_reuses_daily_document_digests(tmp_path):
+    tdir = tmp_path / "transcripts"
+    tdir.mkdir()
+    days = [date(2025, 8, 11), date(2025, 8, 12), date(2025, 8, 13)]
+    for d in days:
+        write_transcript(tdir, d, "0900", f"Matin du {d}: courses, sport.")
+        write_transcript(tdir, d, "1800", f"Soir du {d}: lecture.")
+
+    chat = FakeChat()
+    for d in days:
+        summarize_period(make_summarizer(tmp_path / "cache", chat), "Prompt daily", "daily", d, tdir)
+    assert chat.kinds().count("map") == 6
+
+    weekly_chat = FakeChat()
+    s = make_summarizer(tmp_path / "cache", weekly_chat)
+    html = summarize_period(s, "Prompt weekly", "weekly", date(2025, 8, 17), tdir)
+
+    # Aucun re-map des transcriptions: une fusion par jour + la synthèse finale
+    assert weekly_chat.kinds().count("map") == 0
+    assert weekly_chat.kinds().count("reduce") == 3
+    assert weekly_chat.kinds()[-1] == "html" and html.startswith("html<")
+    assert "Prompt weekly" in weekly_chat.calls[-1][1]
+
+
+def test_monthly_groups_days_by_iso_week(tmp_path):
+    tdir = tmp_path / "transcripts"
+    tdir.mkdir()
+    # Lundi 4 et mercredi 6 (semaine 32), mardi 12 (semaine 33) ; rien entre les deux
+    for d in (date(2025, 8, 4), date(2025, 8, 6), date(2025, 8, 12)):
+        write_transcript(tdir, d, "0900", f"Note du {d}.")
+
+    chat = FakeChat()
+    s = make_summarizer(tmp_path / "cache", chat)
+    summarize_period(s, "Prompt monthly", "monthly", date(2025, 8, 31), tdir)
+
+    reduce_inputs = [u for sys_, u in chat.calls if sys_ == REDUCE_INSTRUCTION]
+    assert len(reduce_inputs) == 1  # une seule semaine à fusionner: la 32 (2 jours)
+    assert "[2025-08-04]" in reduce_inputs[0] and "[2025-08-06]" in reduce_inputs[0]
+    assert "[2025-08-12]" not in reduce_inputs[0]
+    final = chat.calls[-1][1]
+    assert "[2025-08-12]" in final
+
+
+# ---------- make_chat (stub HTTP) ----------
+
+def test_make_chat_retries_then_returns_content(stub_server, monkeypatch):
+    monkeypatch.setattr(summarize_mapreduce, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+    stub = stub_server([(502, "bad gateway"), (429, "slow"),
+                        (200, {"choices": [{"message": {"content": "<h1>ok</h1>"}}]})])
+
+    chat = make_chat(stub.url, "sk-test", "gpt-test")
+    assert chat("system", "user") == "<h1>ok</h1>"
+    assert len(stub.requests) == 3
+    assert stub.requests[-1]["headers"]["Authorization"] == "Bearer sk-test"
+
+
+def test_make_chat_raises_on_client_error(stub_server, monkeypatch):
+    monkeypatch.setattr(summarize_mapreduce, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+    stub = stub_server([(400, "context_length_exceeded")])
+
+    chat = make_chat(stub.url, "sk-test", "gpt-test")
+    with pytest.raises(RuntimeError, match="context_length_exceeded"):
+        chat("system", "user")
+    assert len(stub.requests) == 1
@@ -0,0 +1,257 @@
+import os
+import json
+import base64
+import re
+import time
+from pathlib import Path
+from datetime import datetime, timezone
+
+import pytest
+
+import worker_queue
+from gas_client import GasClient
+from worker_queue import GasBackend, LocalDirBackend, build_transcript_doc_name, drain_queue, mime_type_for, \
+    transcribe_audio, transcribe_split
+
+
+class RecordingBackend(LocalDirBackend):
+    """LocalDirBackend qui enregistre l'ordre des effets de bord."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = []
+
+    def create_transcript(self, doc_name, audio_name, text):
+        self.events.append(("doc", audio_name))
+        return super().create_transcript(doc_name, audio_name, text)
+
+    def archive_audio(self, audio):
+        self.events.append(("archive", audio["name"]))
+        super().archive_audio(audio)
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    src = tmp_path / "source"
+    src.mkdir()
+    backend = RecordingBackend(str(src), str(tmp_path / "archive"), str(tmp_path / "transcripts"))
+    return src, backend
+
+
+def add_audio(src, name, created_ts, size=100):
+    p = src / name
+    p.write_bytes(b"\0" * size)
+    os.utime(p, (created_ts, created_ts))
+    return p
+
+
+BASE_TS = datetime(2025, 8, 18, 7, 30, tzinfo=timezone.utc).timestamp()
+
+
+def test_drain_queue_fifo_side_effects(dirs):
+    src, backend = dirs
+    # Le plus ancien est le plus lent: les effets de bord doivent rester FIFO
+    add_audio(src, "c.mp3", BASE_TS + 120)
+    add_audio(src, "a.mp3", BASE_TS)
+    add_audio(src, "b.mp3", BASE_TS + 60)
+    delays = {"a.mp3": 0.3, "b.mp3": 0.1, "c.mp3": 0.0}
+
+    def transcribe(data, audio):
+        time.sleep(delays[audio["name"]])
+        return f"texte {audio['name']}"
+
+    report = drain_queue(backend, transcribe, workers=3)
+
+    assert backend.events == [
+        ("doc", "a.mp3"), ("archive", "a.mp3"),
+        ("doc", "b.mp3"), ("archive", "b.mp3"),
+        ("doc", "c.mp3"), ("archive", "c.mp3"),
+    ]
+    assert report["failed"] == [] and report["skipped"] == []
+    assert sorted(p.name for p in backend.archive_dir.iterdir()) == ["a.mp3", "b.mp3", "c.mp3"]
+    assert list(src.iterdir()) == []
+
+
+def test_drain_queue_doc_name(dirs):
+    src, backend = dirs
+    add_audio(src, "mémo vocal (1).mp3", BASE_TS)
+
+    report = drain_queue(backend, lambda data, audio: "bonjour", workers=1)
+
+    # 07:30 UTC = 09:30 Europe/Paris (heure d'été)
+    assert report["done"] == ["2025-08-18-0930__m_mo vocal _1_.mp3"]
+    doc = backend.transcripts_dir / "2025-08-18-0930__m_mo vocal _1_.mp3.txt"
+    assert doc.read_text(encoding="utf-8") == "Transcription de mémo vocal (1).mp3\nbonjour\n"
+
+
+@pytest.mark.parametrize("name, mime", [
+    ("a.MP3", "audio/mpeg"), ("a.m4a", "audio/x-m4a"), ("a.mp4", "audio/mp4"),
+    ("a.webm", "audio/webm"), ("a.wav", "audio/wav"), ("a.ogg", "audio/ogg"), ("a.txt", "application/octet-stream"),
+])
+def test_mime_type_for(name, mime):
+    assert mime_type_for(Path(name)) == mime
+
+
+def test_local_backend_lists_webm_and_mp4(dirs):
+    src, backend = dirs
+    for name in ("a.webm", "b.mp4", "notes.txt"):
+        add_audio(src, name, BASE_TS)
+    assert sorted(a["name"] for a in backend.list_audio(worker_queue.AUDIO_MIME_TYPES)) == ["a.webm", "b.mp4"]
+
+
+def test_build_transcript_doc_name_truncated():
+    audio = {"name": "x" * 300 + ".mp3", "created": datetime(2025, 1, 5, 23, 5, tzinfo=timezone.utc)}
+    name = build_transcript_doc_name(audio)
+    assert re.match(r"^2025-01-06-0005__x+\.\.\.x+\.mp3$", name)
+    assert len(name) <= 140
+
+
+def test_drain_queue_oversized_is_skipped_with_alert(dirs):
+    src, backend = dirs
+    big = add_audio(src, "big.mp3", BASE_TS, size=2 * 1024 * 1024)
+    add_audio(src, "small.mp3", BASE_TS + 60)
+    seen = []
+
+    def transcribe(data, audio):
+        seen.append(audio["name"])
+        return "ok"
+
+    report = drain_queue(backend, transcribe, workers=2, max_audio_mb=1)
+
+    assert seen == ["small.mp3"]
+    assert report["skipped"] == ["big.mp3"]
+    assert big.exists()
+    assert "audio trop volumineux" in backend.alert_log.read_text(encoding="utf-8")
+
+
+def test_drain_queue_oversized_uses_split_callback(dirs):
+    src, backend = dirs
+    add_audio(src, "big.mp3", BASE_TS, size=2 * 1024 * 1024)
+
+    report = drain_queue(backend, lambda data, audio: "normal", workers=1, max_audio_mb=1,
+                         transcribe_oversized=lambda data, audio: "découpé")
+
+    assert report["skipped"] == [] and len(report["done"]) == 1
+    assert "découpé" in (backend.transcripts_dir / f"{report['done'][0]}.txt").read_text(encoding="utf-8")
+
+
+def test_drain_queue_failure_leaves_file_in_place(dirs):
+    src, backend = dirs
+    bad = add_audio(src, "bad.mp3", BASE_TS)
+    add_audio(src, "good.mp3", BASE_TS + 60)
+
+    def transcribe(data, audio):
+        if audio["name"] == "bad.mp3":
+            raise RuntimeError("Erreur API transcription : boom")
+        return "ok"
+
+    report = drain_queue(backend, transcribe, workers=2)
+
+    assert report["failed"] == ["bad.mp3"]
+    assert len(report["done"]) == 1
+    assert bad.exists()
+    assert backend.events == [("doc", "good.mp3"), ("archive", "good.mp3")]
+    alerts = backend.alert_log.read_text(encoding="utf-8")
+    assert "transcription FAILED" in alerts and "boom" in alerts
+
+
+def test_transcribe_audio_retries_then_succeeds(stub_server, monkeypatch):
+    monkeypatch.setattr(worker_queue, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+    stub = stub_server([(500, "oops"), (503, "busy"), (200, {"text": "bonjour"})])
+
+    text = transcribe_audio(b"ID3data", "a.mp3", "audio/mpeg", stub.url, "sk-test", backoff_ms=1)
+
+    assert text == "bonjour"
+    assert len(stub.requests) == 3
+    req = stub.requests[-1]
+    assert req["headers"]["Authorization"] == "Bearer sk-test"
+    assert b'name="model"' in req["body"] and b"whisper-1" in req["body"]
+    assert b'filename="a.mp3"' in req["body"] and b"ID3data" in req["body"]
+
+
+def test_transcribe_audio_gives_up_on_client_error(stub_server, monkeypatch):
+    monkeypatch.setattr(worker_queue, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+    stub = stub_server([(400, "bad request")])
+
+    with pytest.raises(RuntimeError, match="bad request"):
+        transcribe_audio(b"x", "a.mp3", "audio/mpeg", stub.url, "sk-test")
+    assert len(stub.requests) == 1
+
+
+def test_transcribe_audio_exhausts_retries(stub_server, monkeypatch):
+    monkeypatch.setattr(worker_queue, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+    stub = stub_server([(429, "slow down")])
+
+    with pytest.raises(RuntimeError, match="slow down"):
+        transcribe_audio(b"x", "a.mp3", "audio/mpeg", stub.url, "sk-test", max_attempts=3)
+    assert len(stub.requests) == 3
+
+
+def test_transcribe_split_keeps_original_mime_when_not_reencoded(monkeypatch):
+    def fake_split(path, max_chunk_sec, out_dir, max_bytes):
+        return [{"path": Path(path), "start": 0.0, "end": 10.0, "keep_start": 0.0, "keep_end": 10.0}]
+
+    monkeypatch.setattr(worker_queue, "split_on_silence", fake_split)
+    seen = []
+
+    def transcribe(data, audio):
+        seen.append((data, audio["name"], audio["mime"]))
+        return "ok"
+
+    audio = {"name": "note.wav", "mime": "audio/wav"}
+    assert transcribe_split(b"RIFF", audio, transcribe) == "ok"
+    assert seen == [(b"RIFF", "note.wav", "audio/wav")]
+
+
+def test_transcribe_split_reencoded_chunks_are_mp3(monkeypatch):
+    def fake_split(path, max_chunk_sec, out_dir, max_bytes):
+        assert max_bytes == 25 * 1024 * 1024
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        (out / "chunk_0000.mp3").write_bytes(b"ID3")
+        return [{"path": out / "chunk_0000.mp3", "start": 0.0, "end": 10.0, "keep_start": 0.0, "keep_end": 10.0}]
+
+    monkeypatch.setattr(worker_queue, "split_on_silence", fake_split)
+    seen = []
+
+    def transcribe(data, audio):
+        seen.append((data, audio["name"], audio["mime"]))
+        return "ok"
+
+    transcribe_split(b"RIFF" * 10, {"name": "note.wav", "mime": "audio/wav"}, transcribe)
+    assert seen == [(b"ID3", "chunk_0000.mp3", "audio/mpeg")]
+
+
+def test_gas_backend_drains_queue(stub_server, monkeypatch):
+    import gas_client
+    monkeypatch.setattr(gas_client, "compute_backoff_with_jitter", lambda base_ms, attempt: 1)
+    files = [
+        {"id": "f2", "name": "b.m4a", "size": 10, "mimeType": "audio/x-m4a", "created": "2025-08-18T08:00:00Z"},
+        {"id": "f1", "name": "a.mp3", "size": 10, "mimeType": "audio/mpeg", "created": "2025-08-18T07:30:00Z"},
+        {"id": "f3", "name": "doc.pdf", "size": 10, "mimeType": "application/pdf", "created": "2025-08-18T07:00:00Z"},
+    ]
+
+    def handler(req):
+        action = req["query"]["action"]
+        if action == "listAudio":
+            return 200, {"files": files}
+        if action == "downloadAudio":
+            return 200, {"data": base64.b64encode(req["query"]["id"].encode()).decode()}
+        if action == "createTranscript":
+            return 200, {"docId": "doc-" + json.loads(req["body"])["fileName"]}
+        return 200, {"ok": True}
+
+    stub = stub_server(handler)
+    backend = GasBackend(GasClient(base_url=stub.url, token="tok"))
+
+    report = drain_queue(backend, lambda data, audio: data.decode(), workers=2)
+
+    assert report["done"] == ["2025-08-18-0930__a.mp3", "2025-08-18-1000__b.m4a"]
+    calls = [(r["query"]["action"], r["query"].get("id")) for r in stub.requests]
+    assert calls[0] == ("listAudio", None)
+    assert sorted(calls[1:3]) == [("downloadAudio", "f1"), ("downloadAudio", "f2")]
+    assert calls[3:] == [("createTranscript", None), ("archiveAudio", "f1"),
+                         ("createTranscript", None), ("archiveAudio", "f2")]
+    assert json.loads(stub.requests[3]["body"]) == {"docName": "2025-08-18-0930__a.mp3", "fileName": "a.mp3",
+                                                    "text": "f1"}
+    assert all(r["query"]["token"] == "tok" for r in stub.requests)
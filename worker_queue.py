@@ -0,0 +1,376 @@
+import os
+import re
+import sys
+import time
+import base64
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable
+
+import requests
+
+from audio_split import split_on_silence, transcribe_chunks_parallel, stitch_texts
+from gas_client import GasClient, should_retry_status, compute_backoff_with_jitter
+
+# Pendant Python de hourlyTranscriptionWorker (worker_hourly.gs) :
+# au lieu d'UN audio par heure, on vide toute la file du dossier source
+# avec un pool borné de transcriptions concurrentes.
+# - ordre FIFO (plus ancien d'abord) pour les Docs créés et l'archivage
+# - garde-fou MAX_AUDIO_MB: découpe aux silences + transcription parallèle des morceaux
+#   (ou, avec --no_split, alerte + fichier laissé en place comme le worker GAS)
+# - retries identiques à transcribeAudio_ (shouldRetryStatus_ / computeBackoffWithJitter_)
+# - nommage "YYYY-MM-DD-HHmm__<audio>" comme le worker GAS
+
+# =========================
+# Config (miroir de config.gs)
+# =========================
+
+OPENAI_API_URL = "https://api.openai.com/v1/audio/transcriptions"
+MAX_AUDIO_MB = 25
+TRANSCRIBE_MAX_ATTEMPTS = 4
+TRANSCRIBE_BACKOFF_MS = 1500
+AUDIO_MIME_TYPES = [
+    "audio/mpeg", "audio/mp4", "audio/x-m4a", "audio/wav", "audio/x-wav",
+    "audio/webm", "audio/ogg"
+]
+SCRIPT_TZ = "Europe/Paris"
+
+# Types MIME par extension (backend local), indépendants de la base mimetypes du système
+# qui donne video/webm et video/mp4 pour des mémos vocaux
+AUDIO_MIME_BY_EXT = {
+    ".mp3": "audio/mpeg", ".m4a": "audio/x-m4a", ".mp4": "audio/mp4", ".wav": "audio/wav",
+    ".webm": "audio/webm", ".ogg": "audio/ogg", ".oga": "audio/ogg", ".opus": "audio/ogg",
+}
+
+# =========================
+# Utils (miroir de utils.gs)
+# =========================
+
+def sanitize_for_title(s: str) -> str:
+    s = re.sub(r"[^\w\-. ]", "_", str(s), flags=re.ASCII)
+    s = re.sub(r"_+", "_", s)
+    return s.strip()
+
+def truncate_middle(s: str, max_len: int) -> str:
+    if not max_len or len(s) <= max_len:
+        return s
+    keep = (max_len - 3) // 2
+    return s[:keep] + "..." + s[-keep:]
+
+def build_transcript_doc_name(audio: Dict[str, Any], tz: str = SCRIPT_TZ) -> str:
+    """'YYYY-MM-DD-HHmm__<nom audio>' basé sur la date de création du fichier."""
+    created = audio["created"].astimezone(ZoneInfo(tz))
+    base = f"{created:%Y-%m-%d}-{created:%H%M}__{sanitize_for_title(audio['name'])}"
+    return truncate_middle(base, 140)
+
+def mime_type_for(path: Path) -> str:
+    return AUDIO_MIME_BY_EXT.get(path.suffix.lower(), "application/octet-stream")
+
+def parse_iso_datetime(s: str) -> datetime:
+    d = datetime.fromisoformat(str(s).replace("Z", "+00:00"))
+    return d if d.tzinfo else d.replace(tzinfo=timezone.utc)
+
+# =========================
+# Backends de stockage
+# =========================
+# Un backend expose:
+#   list_audio(mime_types)                         -> [{"id","name","size","mime","created"}] (ordre quelconque)
+#   read_audio(audio)                              -> bytes
+#   create_transcript(doc_name, audio_name, text)  -> str (id/chemin du Doc)
+#   archive_audio(audio)                           -> None
+#   alert(subject, body)                           -> None
+
+class LocalDirBackend:
+    """Stand-in local de Drive: dossiers source/archive/transcriptions sur disque."""
+
+    def __init__(self, source_dir: str, archive_dir: str, transcripts_dir: str, alert_log: str | None = None):
+        self.source_dir = Path(source_dir)
+        self.archive_dir = Path(archive_dir)
+        self.transcripts_dir = Path(transcripts_dir)
+        self.alert_log = Path(alert_log) if alert_log else self.transcripts_dir / "alerts.log"
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.transcripts_dir.mkdir(parents=True, exist_ok=True)
+
+    def list_audio(self, mime_types: List[str]) -> List[Dict[str, Any]]:
+        out = []
+        for p in self.source_dir.iterdir():
+            if not p.is_file():
+                continue
+            mime = mime_type_for(p)
+            if mime_types and mime not in mime_types:
+                continue
+            st = p.stat()
+            out.append({
+                "id": str(p),
+                "name": p.name,
+                "size": st.st_size,
+                "mime": mime,
+                "created": datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+            })
+        return out
+
+    def read_audio(self, audio: Dict[str, Any]) -> bytes:
+        return Path(audio["id"]).read_bytes()
+
+    def create_transcript(self, doc_name: str, audio_name: str, text: str) -> str:
+        path = self.transcripts_dir / f"{doc_name}.txt"
+        path.write_text(f"Transcription de {audio_name}\n{text}\n", encoding="utf-8")
+        return str(path)
+
+    def archive_audio(self, audio: Dict[str, Any]) -> None:
+        src = Path(audio["id"])
+        src.replace(self.archive_dir / src.name)
+
+    def alert(self, subject: str, body: str) -> None:
+        with open(self.alert_log, "a", encoding="utf-8") as f:
+            f.write(f"{datetime.now(timezone.utc).isoformat()} | {subject} | {body}\n")
+
+
+class GasBackend:
+    """
+    Backend Drive via le web-app GAS (GasClient: session partagée, retries).
+    Ces actions ne sont PAS dans ce dépôt (pas de doGet/doPost dans les .gs): le web-app
+    déployé doit les fournir. Actions attendues côté web-app:
+      - listAudio (GET)        -> {"files": [{"id","name","size","mimeType","created"}]}
+      - downloadAudio (GET)    -> {"data": <base64>}
+      - createTranscript (POST JSON {"docName","fileName","text"}) -> {"docId": ...}
+      - archiveAudio (POST)    -> {"ok": true}
+      - alert (POST JSON {"subject","body"})
+    L'audio transite en base64 dans une réponse JSON: pas de découpe des audios > MAX_AUDIO_MB
+    avec ce backend (alerte + fichier laissé en place, comme le worker GAS).
+    """
+
+    def __init__(self, client: GasClient):
+        self.client = client
+
+    def list_audio(self, mime_types: List[str]) -> List[Dict[str, Any]]:
+        files = self.client.get("listAudio").get("files", [])
+        out = []
+        for f in files:
+            mime = f.get("mimeType", "")
+            if mime_types and mime not in mime_types:
+                continue
+            out.append({
+                "id": f["id"],
+                "name": f["name"],
+                "size": int(f.get("size", 0)),
+                "mime": mime,
+                "created": parse_iso_datetime(f["created"]),
+            })
+        return out
+
+    def read_audio(self, audio: Dict[str, Any]) -> bytes:
+        return base64.b64decode(self.client.get("downloadAudio", id=audio["id"])["data"])
+
+    def create_transcript(self, doc_name: str, audio_name: str, text: str) -> str:
+        res = self.client.post("createTranscript", {"docName": doc_name, "fileName": audio_name, "text": text})
+        return str(res.get("docId", doc_name))
+
+    def archive_audio(self, audio: Dict[str, Any]) -> None:
+        self.client.post("archiveAudio", None, id=audio["id"])
+
+    def alert(self, subject: str, body: str) -> None:
+        self.client.post("alert", {"subject": subject, "body": body})
+
+# =========================
+# Transcription (Whisper API, retries)
+# =========================
+
+def transcribe_audio(data: bytes, filename: str, mime: str, api_url: str, api_key: str,
+                     model: str = "whisper-1",
+                     max_attempts: int = TRANSCRIBE_MAX_ATTEMPTS,
+                     backoff_ms: int = TRANSCRIBE_BACKOFF_MS,
+                     session: requests.Session | None = None,
+                     timeout: float = 600.0) -> str:
+    """Même sémantique que transcribeAudio_: retry sur 429/408/5xx et sur exceptions réseau."""
+    http = session or requests
+    for attempt in range(1, max_attempts + 1):
+        try:
+            r = http.post(
+                api_url,
+                headers={"Authorization": f"Bearer {api_key}"},
+                files={"file": (filename, data, mime)},
+                data={"model": model},
+                timeout=timeout,
+            )
+        except requests.RequestException as e:
+            if attempt < max_attempts:
+                delay = compute_backoff_with_jitter(backoff_ms, attempt)
+                print(f"[WARN] Whisper: tentative {attempt}/{max_attempts} exception ({e}). Retry dans {delay} ms.")
+                time.sleep(delay / 1000.0)
+                continue
+            raise RuntimeError(f"Erreur API transcription : {e}")
+
+        if r.status_code == 200:
+            return r.json()["text"]
+        if should_retry_status(r.status_code) and attempt < max_attempts:
+            delay = compute_backoff_with_jitter(backoff_ms, attempt)
+            print(f"[WARN] Whisper: tentative {attempt}/{max_attempts} échouée (HTTP {r.status_code}). Retry dans {delay} ms.")
+            time.sleep(delay / 1000.0)
+            continue
+        raise RuntimeError(f"Erreur API transcription : {r.text}")
+    # Défensif (ne doit pas être atteint)
+    raise RuntimeError("Erreur API transcription : épuisement des retries")
+
+def transcribe_split(data: bytes, audio: Dict[str, Any], transcribe: Callable[[bytes, Dict[str, Any]], str],
+                     max_chunk_sec: float = 600.0, workers: int = 4, max_audio_mb: float = MAX_AUDIO_MB) -> str:
+    """
+    Audio trop volumineux: découpe aux silences (ou simple ré-encodage s'il est court mais lourd),
+    transcrit les morceaux en parallèle, recolle le texte.
+    """
+    with tempfile.TemporaryDirectory(prefix="wq_split_") as tmp:
+        src = Path(tmp) / (sanitize_for_title(audio["name"]) or "audio")
+        src.write_bytes(data)
+        chunks = split_on_silence(str(src), max_chunk_sec=max_chunk_sec, out_dir=str(Path(tmp) / "chunks"),
+                                  max_bytes=int(max_audio_mb * 1024 * 1024) if max_audio_mb else None)
+
+        def one(c: Dict[str, Any]) -> str:
+            if c["path"] == src:
+                # Non ré-encodé: nom et type MIME d'origine
+                return transcribe(data, audio)
+            part = {**audio, "name": c["path"].name, "mime": "audio/mpeg"}
+            return transcribe(c["path"].read_bytes(), part)
+
+        return stitch_texts(transcribe_chunks_parallel(chunks, one, workers=workers))
+
+# =========================
+# Drain de la file
+# =========================
+
+def drain_queue(backend, transcribe: Callable[[bytes, Dict[str, Any]], str],
+                workers: int = 4, max_audio_mb: float = MAX_AUDIO_MB,
+                mime_types: List[str] = AUDIO_MIME_TYPES, tz: str = SCRIPT_TZ,
+                transcribe_oversized: Callable[[bytes, Dict[str, Any]], str] | None = None) -> Dict[str, Any]:
+    """
+    Transcrit tous les audios du dossier source avec au plus `workers` transcriptions en vol.
+    Les transcriptions tournent en parallèle, mais la création des Docs et l'archivage
+    se font dans l'ordre FIFO (plus ancien d'abord), comme des runs horaires successifs.
+    Audio > max_audio_mb: transcribe_oversized si fourni, sinon alerte + fichier laissé en place.
+    Un échec sur un fichier => alerte + fichier laissé en place, on continue la file.
+    """
+    candidates = sorted(backend.list_audio(mime_types), key=lambda a: (a["created"], a["name"]))
+    report = {"done": [], "skipped": [], "failed": []}
+    if not candidates:
+        print("[INFO] Aucun nouvel audio à traiter.")
+        return report
+
+    def is_oversized(audio: Dict[str, Any]) -> bool:
+        return bool(max_audio_mb) and audio["size"] / (1024 * 1024) > max_audio_mb
+
+    queue = []
+    for audio in candidates:
+        size_mb = audio["size"] / (1024 * 1024)
+        if is_oversized(audio) and transcribe_oversized is None:
+            msg = f"Audio trop volumineux ({size_mb:.2f} MB > {max_audio_mb} MB) : {audio['name']}"
+            print(f"[WARN] {msg}")
+            backend.alert("Queue worker - audio trop volumineux", msg)
+            report["skipped"].append(audio["name"])
+            continue
+        queue.append(audio)
+
+    print(f"[INFO] File: {len(queue)} audio(s) à transcrire ({workers} en parallèle)")
+
+    def job(audio: Dict[str, Any]) -> str:
+        size_mb = audio["size"] / (1024 * 1024)
+        if is_oversized(audio):
+            print(f"[INFO] Transcription découpée de: {audio['name']} ({size_mb:.2f} MB > {max_audio_mb} MB)")
+            return transcribe_oversized(backend.read_audio(audio), audio)
+        print(f"[INFO] Transcription de: {audio['name']} ({size_mb:.2f} MB)")
+        return transcribe(backend.read_audio(audio), audio)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(audio, pool.submit(job, audio)) for audio in queue]
+        # On consomme dans l'ordre de soumission => effets de bord FIFO
+        for audio, fut in futures:
+            try:
+                text = fut.result()
+                doc_name = build_transcript_doc_name(audio, tz)
+                backend.create_transcript(doc_name, audio["name"], text)
+                print(f"[INFO] Doc de transcription créé: {doc_name}")
+                backend.archive_audio(audio)
+                print(f"[INFO] Audio archivé: {audio['name']}")
+                report["done"].append(doc_name)
+            except Exception as e:
+                err = f"{audio['name']}: {e}"
+                print(f"[ERROR] Queue worker: {err}")
+                backend.alert("Queue worker - transcription FAILED", err)
+                report["failed"].append(audio["name"])
+    return report
+
+# =========================
+# Main
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Vide la file d'audios du dossier source (transcriptions en parallèle)")
+    parser.add_argument("--backend", choices=["local", "gas"], default="local",
+                        help="gas: requiert les actions listAudio/downloadAudio/createTranscript/archiveAudio/alert "
+                             "côté web-app (non incluses dans ce dépôt)")
+    parser.add_argument("--source_dir", help="[local] dossier des audios à traiter")
+    parser.add_argument("--archive_dir", help="[local] dossier d'archive des audios")
+    parser.add_argument("--transcripts_dir", help="[local] dossier des transcriptions (.txt)")
+    parser.add_argument("--alert_log", default=None, help="[local] fichier des alertes (défaut: <transcripts_dir>/alerts.log)")
+    parser.add_argument("--gas_base_url", default=os.environ.get("GAS_BASE_URL"))
+    parser.add_argument("--gas_token", default=os.environ.get("GAS_TOKEN"))
+    parser.add_argument("--api_url", default=OPENAI_API_URL, help="Endpoint de transcription (compatible Whisper)")
+    parser.add_argument("--model", default="whisper-1")
+    parser.add_argument("--workers", type=int, default=4, help="Transcriptions concurrentes max")
+    parser.add_argument("--max_audio_mb", type=float, default=MAX_AUDIO_MB)
+    parser.add_argument("--no_split", action="store_true", help="Audio > max_audio_mb: alerte + skip au lieu de découper")
+    parser.add_argument("--chunk_sec", type=float, default=600.0, help="Durée max d'un morceau d'audio découpé (s)")
+    parser.add_argument("--chunk_workers", type=int, default=4, help="Morceaux transcrits en parallèle par audio découpé")
+    parser.add_argument("--max_attempts", type=int, default=TRANSCRIBE_MAX_ATTEMPTS)
+    parser.add_argument("--backoff_ms", type=int, default=TRANSCRIBE_BACKOFF_MS)
+    parser.add_argument("--tz", default=SCRIPT_TZ)
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY manquant.")
+
+    if args.backend == "local":
+        if not (args.source_dir and args.archive_dir and args.transcripts_dir):
+            parser.error("--backend local requiert --source_dir, --archive_dir et --transcripts_dir")
+        backend = LocalDirBackend(args.source_dir, args.archive_dir, args.transcripts_dir, args.alert_log)
+    else:
+        if not (args.gas_base_url and args.gas_token):
+            parser.error("--backend gas requiert --gas_base_url et --gas_token (ou GAS_BASE_URL / GAS_TOKEN)")
+        backend = GasBackend(GasClient(args.gas_base_url, args.gas_token, pool_size=max(1, args.workers)))
+
+    # Une session partagée (keep-alive) pour toutes les requêtes Whisper
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, args.workers))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def transcribe(data: bytes, audio: Dict[str, Any]) -> str:
+        return transcribe_audio(
+            data, audio["name"], audio["mime"], args.api_url, api_key,
+            model=args.model, max_attempts=args.max_attempts, backoff_ms=args.backoff_ms, session=session,
+        )
+
+    def transcribe_oversized(data: bytes, audio: Dict[str, Any]) -> str:
+        return transcribe_split(data, audio, transcribe, max_chunk_sec=args.chunk_sec, workers=args.chunk_workers,
+                                max_audio_mb=args.max_audio_mb)
+
+    # GasBackend: audio en base64 dans du JSON => pas de téléchargement des audios trop volumineux
+    split = not args.no_split and args.backend == "local"
+    if not args.no_split and not split:
+        print("[INFO] --backend gas: audios > max_audio_mb ignorés avec alerte (pas de découpe)")
+
+    print("--- QUEUE WORKER start ---")
+    t0 = time.time()
+    report = drain_queue(backend, transcribe, workers=args.workers, max_audio_mb=args.max_audio_mb, tz=args.tz,
+                         transcribe_oversized=transcribe_oversized if split else None)
+    print(f"[INFO] Transcrits: {len(report['done'])} | ignorés (taille): {len(report['skipped'])} "
+          f"| échecs: {len(report['failed'])} | {time.time() - t0:.1f}s")
+    print("--- QUEUE WORKER end ---")
+    if report["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ import zipfile
 import argparse
 import tempfile
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 # --- Audio utils ---
 from pydub import AudioSegment
@@ -20,6 +20,10 @@ import whisperx
 from openai import OpenAI
 client = OpenAI()  # client global
 
+# --- Codecs de sortie + chapitres ---
+from audio_codecs import CODECS, get_codec, build_chapters, locate_in_sources, write_ffmetadata, \
+    write_chapters_sidecar, encode_audio, compare_codecs, format_codec_stats
+
 # =========================
 # Utils
 # =========================
@@ -271,13 +275,18 @@ def select_segments_to_target(scored_segments: List[Dict[str, Any]], target_seco
 # 4) Construire le best-of audio
 # =========================
 
-def build_bestof_audio(concat_mp3_path: str, clips: List[Dict[str, Any]], out_path: str) -> float:
+def build_bestof_audio(concat_mp3_path: str, clips: List[Dict[str, Any]], out_path: str,
+                       codec: str = "mp3",
+                       compare_dir: str | None = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
     """
-    Extrait chaque clip [start,end] de l'audio concaténé et les assemble.
-    Retourne la durée du best-of (sec).
+    Extrait chaque clip [start,end] de l'audio concaténé et les assemble,
+    puis encode avec le preset `codec` (chapitres embarqués).
+    Retourne les mesures d'encodage (durée, taille, kbps, temps) et les chapitres des clips
+    réellement montés (clips vides ignorés, fin bornée à l'audio), pour le sidecar JSON.
     """
     base = AudioSegment.from_file(concat_mp3_path, format="mp3")
     bestof = AudioSegment.silent(duration=0)
+    kept = []
     for c in clips:
         start_ms = int(c["start"] * 1000)
         end_ms = int(c["end"] * 1000)
@@ -286,10 +295,26 @@ def build_bestof_audio(concat_mp3_path: str, clips: List[Dict[str, Any]], out_pa
         if start_ms < 0 or start_ms >= end_ms:
             continue
         bestof += base[start_ms:end_ms]
+        k = {**c, "start": start_ms / 1000.0, "end": end_ms / 1000.0}
+        if "src_start" in c:
+            k["src_end"] = min(float(c["src_end"]), float(c["src_start"]) + (end_ms - start_ms) / 1000.0)
+        kept.append(k)
 
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    bestof.export(out_path, format="mp3")
-    return len(bestof) / 1000.0
+    with tempfile.TemporaryDirectory(prefix="whx_bestof_") as tmp:
+        tempdir = Path(tmp)
+        wav_path = str(tempdir / "bestof.wav")
+        bestof.export(wav_path, format="wav")
+
+        if compare_dir:
+            compare_codecs(wav_path, compare_dir)
+
+        chapters = build_chapters(kept)
+        ffmeta = write_ffmetadata(chapters, tempdir / "chapters.ffmeta")
+        stats = encode_audio(wav_path, out_path, codec, ffmetadata=ffmeta)
+    stats["duration"] = len(bestof) / 1000.0
+    print(f"[INFO] Encodage: {format_codec_stats(stats)}")
+    return stats, chapters
 
 # =========================
 # Main pipeline
@@ -302,6 +327,8 @@ def main():
     parser.add_argument("--silence_between", type=float, default=10.0, help="Silence (s) entre MP3 à la concaténation")
     parser.add_argument("--openai_model", default="gpt-4o-mini", help="Modèle OpenAI pour le scoring des segments")
     parser.add_argument("--out_dir", default="bestof_out", help="Dossier de sortie")
+    parser.add_argument("--codec", default="mp3", choices=list(CODECS), help="Codec du best-of (ex: opus-32 pour la voix)")
+    parser.add_argument("--compare_codecs", action="store_true", help="Encode aussi avec chaque preset et affiche taille/temps")
     args = parser.parse_args()
 
     # Clé OpenAI
@@ -345,14 +372,25 @@ def main():
     with open(clips_json_path, "w", encoding="utf-8") as f:
         json.dump({"clips": chosen, "target_seconds": target_seconds, "input_seconds": total_input}, f, ensure_ascii=False, indent=2)
 
-    bestof_mp3 = str(out_dir / "bestof.mp3")
-    best_dur = build_bestof_audio(concat_mp3, chosen, bestof_mp3)
+    bestof_path = str(out_dir / f"bestof{get_codec(args.codec)['ext']}")
+    located = locate_in_sources(chosen, concat_info["file_map"])
+    stats, chapters = build_bestof_audio(
+        concat_mp3, located, bestof_path, codec=args.codec,
+        compare_dir=str(out_dir / "codec_compare") if args.compare_codecs else None,
+    )
+    best_dur = stats["duration"]
+
+    # Index des chapitres (mêmes offsets que les chapitres embarqués): offset best-of -> fichier source / start / label
+    chapters_json_path = str(out_dir / "chapters.json")
+    write_chapters_sidecar(chapters, bestof_path, args.codec, chapters_json_path)
 
     print("\n=== RÉSULTAT ===")
     print(f"Durée input totale : {human_time(total_input)}")
     print(f"Objectif gardé     : {args.keep_pct:.1f}%  (~ {human_time(target_seconds)})")
-    print(f"Best-of produit    : {bestof_mp3}  ({human_time(best_dur)})")
+    print(f"Best-of produit    : {bestof_path}  ({human_time(best_dur)})")
+    print(f"Taille / débit     : {stats['bytes'] / 1e6:.2f} MB  ({stats['kbps']:.1f} kbps, encodage {stats['encode_sec']:.2f}s)")
     print(f"Clips JSON         : {clips_json_path}")
+    print(f"Chapitres JSON     : {chapters_json_path}")
 
 if __name__ == "__main__":
     main()
@@ -3,14 +3,16 @@ import io
 import re
 import json
 import math
+import time
 import zipfile
 import argparse
 import tempfile
+import threading
 import subprocess
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
 
-import requests
+from gas_client import GasClient, DEFAULT_CACHE_DIR
 
 # --- Audio utils (only to probe durations if needed) ---
 from pydub import AudioSegment
@@ -19,9 +21,18 @@ from pydub import AudioSegment
 import torch
 import whisperx
 
-# --- OpenAI ---
-from openai import OpenAI
-client = OpenAI()  # global client
+# --- Scoring GPT (client OpenAI créé au premier appel: --scorer local n'exige ni clé ni réseau) ---
+from gpt_scoring import score_all_segments_with_gpt, openai_label_segments, format_score_stats
+
+# --- Découpe aux silences ---
+from audio_split import probe_duration, split_on_silence, transcribe_chunks_parallel, stitch_word_segments
+
+# --- Codecs de sortie + chapitres ---
+from audio_codecs import CODECS, get_codec, build_chapters, write_ffmetadata, write_chapters_sidecar, \
+    encode_audio, compare_codecs, format_codec_stats
+
+# --- Scoreur local distillé des scores GPT ---
+from local_scorer import LocalScorer, append_score_store, agreement, format_agreement, DEFAULT_STORE
 
 # =========================
 # Utils
@@ -47,11 +58,9 @@ def run_ffmpeg(cmd: List[str]):
 # Prompt loader (depuis GAS)
 # =========================
 
-def fetch_prompt(gas_url: str, doc_id: str) -> str:
-    url = f"{gas_url}?docId={doc_id}"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    return r.text.strip()
+def fetch_prompt(gas_url: str, doc_id: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    # Session + retries + cache local (TTL) : le prompt n'est re-téléchargé qu'à expiration
+    return GasClient(prompt_url=gas_url, cache_dir=cache_dir).fetch_prompt(doc_id)
 
 # =========================
 # 1) Unzip (no concat)
@@ -75,15 +84,22 @@ def load_asr_model(device: str, compute_type: str, whisperx_model: str):
     asr_model = whisperx.load_model(whisperx_model, device, compute_type=compute_type)
     return asr_model
 
+_align_lock = threading.Lock()
+_asr_lock = threading.Lock()
+
 def get_align_model(lang: str, device: str, cache: Dict[Tuple[str, str], Tuple[object, dict]], align_model_name: str | None = None):
     """
     Lazy-load and cache alignment model for a given language.
     cache key: (lang, align_model_name or '')
+    Thread-safe: chunks transcribed in parallel share the same cache.
     """
     key = (lang or "", align_model_name or "")
-    if key in cache:
+    with _align_lock:
+        if key not in cache:
+            cache[key] = _load_align_model(lang, device, align_model_name)
         return cache[key]
 
+def _load_align_model(lang: str, device: str, align_model_name: str | None = None):
     # Try with explicit language; if override model name provided, pass it through.
     try:
         align_model, metadata = whisperx.load_align_model(
@@ -94,15 +110,38 @@ def get_align_model(lang: str, device: str, cache: Dict[Tuple[str, str], Tuple[o
     except Exception as e:
         raise RuntimeError(f"Impossible de charger le modèle d'alignement pour la langue '{lang}'. "
                            f"Essayez --align_model <huggingface-model>. Détail: {e}")
-
-    cache[key] = (align_model, metadata)
-    return cache[key]
+    return align_model, metadata
 
 def transcribe_one_file(path: Path, asr_model, device: str, batch_size: int,
                         align_cache: Dict[Tuple[str, str], Tuple[object, dict]],
-                        align_model_name: str | None = None) -> Dict[str, Any]:
-    # ASR for this file
-    result = asr_model.transcribe(str(path), batch_size=batch_size)
+                        align_model_name: str | None = None,
+                        chunk_sec: float = 0.0, chunk_workers: int = 1) -> Dict[str, Any]:
+    """
+    ASR + alignement d'un fichier. Si chunk_sec > 0 et que le fichier dépasse ~1.5x chunk_sec,
+    il est découpé aux silences et les morceaux sont traités par chunk_workers threads
+    (décodage + alignement en parallèle, ASR sérialisé), puis les word_segments sont
+    recollés sur la timeline du fichier.
+    """
+    if chunk_sec and probe_duration(str(path)) > chunk_sec * 1.5:
+        with tempfile.TemporaryDirectory(prefix="whx_chunks_") as tmp:
+            chunks = split_on_silence(str(path), max_chunk_sec=chunk_sec, out_dir=tmp)
+
+            def one(c: Dict[str, Any]) -> List[Dict[str, Any]]:
+                aligned = transcribe_single(c["path"], asr_model, device, batch_size, align_cache, align_model_name)
+                return aligned.get("word_segments", [])
+
+            word_lists = transcribe_chunks_parallel(chunks, one, workers=chunk_workers)
+        return {"word_segments": stitch_word_segments(chunks, word_lists)}
+    return transcribe_single(path, asr_model, device, batch_size, align_cache, align_model_name)
+
+def transcribe_single(path: Path, asr_model, device: str, batch_size: int,
+                      align_cache: Dict[Tuple[str, str], Tuple[object, dict]],
+                      align_model_name: str | None = None) -> Dict[str, Any]:
+    # Decode once (ffmpeg, parallel-safe), then ASR for this file.
+    # The WhisperX pipeline sets its tokenizer / detected language during transcribe(): one call at a time.
+    audio = whisperx.load_audio(str(path))
+    with _asr_lock:
+        result = asr_model.transcribe(audio, batch_size=batch_size)
 
     # Determine language from ASR result
     lang = result.get("language")
@@ -122,7 +161,7 @@ def transcribe_one_file(path: Path, asr_model, device: str, batch_size: int,
     align_model, metadata = get_align_model(lang, device, align_cache, align_model_name)
 
     aligned = whisperx.align(
-        result["segments"], align_model, metadata, str(path), device, return_char_alignments=False
+        result["segments"], align_model, metadata, audio, device, return_char_alignments=False
     )
     return aligned
 
@@ -175,55 +214,34 @@ def words_to_segments(word_segments: List[Dict[str, Any]], max_gap: float = 0.6,
     return segs
 
 # =========================
-# 3) GPT scoring (unchanged)
+# 3) Scoring (GPT: gpt_scoring.py)
 # =========================
 
-def openai_score_segments(segments, model: str, system_prompt: str):
-    payload_segments = [
-        {"i": s["i"], "start": round(s["start"], 2), "end": round(s["end"], 2), "text": s["text"][:3000]}
-        for s in segments
-    ]
-    user_prompt = (
-        "Analyse et score les segments suivants :\n"
-        f"{json.dumps(payload_segments, ensure_ascii=False)}"
-    )
-
-    completion = client.chat.completions.create(
-        model=model,
-        temperature=0.0,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-    )
-    content = completion.choices[0].message.content
-    try:
-        data = json.loads(content)
-        return data.get("scores", [])
-    except Exception:
-        return []
-
-def batched(iterable, n):
-    batch = []
-    for x in iterable:
-        batch.append(x)
-        if len(batch) == n:
-            yield batch
-            batch = []
-    if batch:
-        yield batch
-
-def score_all_segments_with_gpt(segments, model: str, system_prompt: str, batch_size: int = 150):
-    all_scores = []
-    for batch in batched(segments, batch_size):
-        scores = openai_score_segments(batch, model=model, system_prompt=system_prompt)
-        all_scores.extend(scores)
-    score_map = {int(s["i"]): {"score": float(s.get("score", 0.0)), "label": s.get("label", "")} for s in all_scores if "i" in s}
-    out = []
-    for s in segments:
-        meta = score_map.get(s["i"], {"score": 0.0, "label": ""})
-        out.append({**s, **meta})
+def score_segments_local(segments, model: LocalScorer, keep_frac: float, hybrid: bool, gpt_kwargs: Dict[str, Any],
+                         hybrid_max_frac: float = 0.3):
+    """
+    Scoreur local (vectorisé, sans réseau). En mode hybride, seuls les segments incertains
+    (proches du seuil de sélection ou hors vocabulaire appris) sont rescorés par GPT,
+    et l'accord local/GPT est mesuré sur ce sous-ensemble.
+    """
+    t0 = time.time()
+    pred, coverage = model.predict([s["text"] for s in segments], return_coverage=True)
+    print(f"[INFO] Scoreur local ({model.n_train} segments d'entraînement): {len(segments)} segments en {time.time() - t0:.3f}s")
+    out = [{**s, "score": float(p), "label": "", "source": "local"} for s, p in zip(segments, pred)]
+    if not hybrid:
+        return out
+
+    idx = model.uncertain(pred, coverage, keep_frac=keep_frac, max_frac=hybrid_max_frac)
+    print(f"[INFO] Hybride: {len(idx)}/{len(segments)} segments incertains envoyés à GPT")
+    if len(idx) == 0:
+        return out
+    rescored = score_all_segments_with_gpt([segments[k] for k in idx], **gpt_kwargs)
+    ok = [(k, r) for k, r in zip(idx, rescored) if r["source"] == "gpt"]
+    for k, r in ok:
+        out[k] = r
+    if ok:
+        m = agreement(pred[[k for k, _ in ok]], [r["score"] for _, r in ok], keep_frac=keep_frac)
+        print(f"[INFO] Accord local vs GPT (segments incertains): {format_agreement(m)}")
     return out
 
 # =========================
@@ -247,42 +265,59 @@ def select_segments_to_target(scored_segments, target_seconds: float):
 # 4) Build best-of using ffmpeg (no big buffers)
 # =========================
 
-def cut_and_concat_with_ffmpeg(clips: List[Dict[str, Any]], out_path: str):
-    tempdir = Path(tempfile.mkdtemp(prefix="whx_cuts_"))
-    part_files = []
-    # Cut each clip as its own small mp3, re-encode for accurate trims
-    for idx, c in enumerate(clips):
-        src = Path(c["file"])
-        ss = max(0.0, float(c["start"]))
-        to = max(ss, float(c["end"]))
-        part = tempdir / f"part_{idx:05d}.mp3"
-        cmd = [
+def cut_and_concat_with_ffmpeg(clips: List[Dict[str, Any]], out_path: str, codec: str = "mp3",
+                               compare_dir: str | None = None) -> Dict[str, Any]:
+    """
+    Coupe chaque clip en PCM (coupes exactes, pas de perte intermédiaire), concatène,
+    puis encode UNE fois avec le preset `codec` en embarquant les chapitres.
+    Retourne les mesures d'encodage (taille, kbps, temps) ; compare_dir => mesures pour tous les presets.
+    """
+    with tempfile.TemporaryDirectory(prefix="whx_cuts_") as tmp:
+        tempdir = Path(tmp)
+        part_files = []
+        for idx, c in enumerate(clips):
+            src = Path(c["file"])
+            ss = max(0.0, float(c["start"]))
+            to = max(ss, float(c["end"]))
+            part = tempdir / f"part_{idx:05d}.wav"
+            cmd = [
+                "ffmpeg", "-y",
+                "-ss", f"{ss:.3f}",
+                "-to", f"{to:.3f}",
+                "-i", str(src),
+                "-vn",
+                # Format commun (mono 48 kHz) pour concaténer des sources hétérogènes
+                "-ac", "1", "-ar", "48000",
+                "-c:a", "pcm_s16le",
+                str(part),
+            ]
+            run_ffmpeg(cmd)
+            part_files.append(part)
+
+        # Create concat list
+        list_file = tempdir / "concat.txt"
+        with open(list_file, "w", encoding="utf-8") as f:
+            for pf in part_files:
+                f.write(f"file '{pf.as_posix()}'\n")
+
+        # Concatenate without re-encoding (PCM)
+        concat_wav = tempdir / "bestof.wav"
+        cmd_concat = [
             "ffmpeg", "-y",
-            "-ss", f"{ss:.3f}",
-            "-to", f"{to:.3f}",
-            "-i", str(src),
-            "-vn",
-            "-c:a", "libmp3lame", "-q:a", "2",
-            str(part),
+            "-f", "concat", "-safe", "0",
+            "-i", str(list_file),
+            "-c", "copy",
+            str(concat_wav),
         ]
-        run_ffmpeg(cmd)
-        part_files.append(part)
-
-    # Create concat list
-    list_file = tempdir / "concat.txt"
-    with open(list_file, "w", encoding="utf-8") as f:
-        for pf in part_files:
-            f.write(f"file '{pf.as_posix()}'\n")
-
-    # Concatenate without re-encoding
-    cmd_concat = [
-        "ffmpeg", "-y",
-        "-f", "concat", "-safe", "0",
-        "-i", str(list_file),
-        "-c", "copy",
-        out_path,
-    ]
-    run_ffmpeg(cmd_concat)
+        run_ffmpeg(cmd_concat)
+
+        if compare_dir:
+            compare_codecs(str(concat_wav), compare_dir)
+
+        ffmeta = write_ffmetadata(build_chapters(clips), tempdir / "chapters.ffmeta")
+        stats = encode_audio(str(concat_wav), out_path, codec, ffmetadata=ffmeta)
+    print(f"[INFO] Encodage: {format_codec_stats(stats)}")
+    return stats
 
 # =========================
 # Main
@@ -294,17 +329,52 @@ def main():
     parser.add_argument("--keep_pct", type=float, default=20.0)
     parser.add_argument("--openai_model", default="gpt-4o-mini")
     parser.add_argument("--out_dir", default="bestof_out")
-    parser.add_argument("--gas_url", required=True)
-    parser.add_argument("--doc_id", required=True)
+    parser.add_argument("--gas_url", default=None, help="Required unless --scorer local")
+    parser.add_argument("--doc_id", default=None, help="Prompt Doc; required unless --scorer local")
+    parser.add_argument("--gas_cache_dir", default=DEFAULT_CACHE_DIR, help="Local cache for the prompt Doc")
     parser.add_argument("--whisperx_model", default="small", help="tiny|base|small|medium|large-v2")
     parser.add_argument("--device", default=("cuda" if torch.cuda.is_available() else "cpu"))
     parser.add_argument("--compute_type", default=None, help="float16|float32 (default auto)")
     parser.add_argument("--batch_size", type=int, default=8)
     parser.add_argument("--align_model", default=None, help="Optional HF model name for alignment (e.g., 'wav2vec2-large-xlsr-53-french')")
+    parser.add_argument("--chunk_sec", type=float, default=600.0, help="Split files longer than ~1.5x this at silences (0 = never split)")
+    parser.add_argument("--chunk_workers", type=int, default=2, help="Chunks decoded/aligned in parallel for long files (ASR itself is serialized)")
+    parser.add_argument("--score_protocol", default="compact", choices=["compact", "legacy"],
+                        help="compact: [[k, score]] via JSON schema, labels only for selected clips")
+    parser.add_argument("--score_benchmark", action="store_true",
+                        help="Also score all segments with the legacy protocol and report tokens / time "
+                             "(requires --scorer gpt --score_protocol compact; the compact result is used)")
+    parser.add_argument("--scorer", default="gpt", choices=["gpt", "local", "hybrid"],
+                        help="local: distilled model only (no network); hybrid: GPT only for uncertain segments")
+    parser.add_argument("--local_model", default="local_scorer.npz", help="Model trained with local_scorer.py train")
+    parser.add_argument("--hybrid_max_pct", type=float, default=30.0, help="Max share of segments sent to GPT in hybrid mode")
+    parser.add_argument("--score_store", default=DEFAULT_STORE,
+                        help="JSONL where GPT (text, score) pairs are appended to train the local scorer ('' = off)")
+    parser.add_argument("--codec", default="mp3", choices=list(CODECS), help="Best-of output codec (e.g. opus-32 for speech)")
+    parser.add_argument("--compare_codecs", action="store_true", help="Also encode with every codec preset and report size/encode time")
     args = parser.parse_args()
 
-    if not os.environ.get("OPENAI_API_KEY"):
-        raise RuntimeError("OPENAI_API_KEY manquant.")
+    # --scorer local: aucun appel réseau (ni OpenAI, ni prompt GAS)
+    offline = args.scorer == "local"
+    if args.score_benchmark and (args.scorer != "gpt" or args.score_protocol != "compact"):
+        # Compact vs legacy sur le même ensemble de segments uniquement
+        parser.error("--score_benchmark requiert --scorer gpt et --score_protocol compact")
+    if not offline:
+        if not (args.gas_url and args.doc_id):
+            parser.error("--gas_url et --doc_id requis (sauf --scorer local)")
+        if not os.environ.get("OPENAI_API_KEY"):
+            raise RuntimeError("OPENAI_API_KEY manquant.")
+
+    # Modèle local chargé avant la transcription WhisperX: un --local_model absent ou invalide
+    # échoue tout de suite, pas après une heure de CPU
+    local_model = None
+    if args.scorer != "gpt":
+        try:
+            local_model = LocalScorer.load(args.local_model)
+        except Exception as e:
+            parser.error(f"--local_model {args.local_model} illisible ({type(e).__name__}: {e}). "
+                         f"Entraîner d'abord: python local_scorer.py train --model {args.local_model}")
+        print(f"[INFO] Scoreur local chargé: {args.local_model} ({local_model.n_train} segments d'entraînement)")
 
     # Be conservative with CPU threads (helps RAM too)
     try:
@@ -314,9 +384,12 @@ def main():
 
     compute_type = args.compute_type or ("float16" if args.device == "cuda" else "float32")
 
-    # Charger le prompt depuis Google Doc via GAS
-    system_prompt = fetch_prompt(args.gas_url, args.doc_id)
-    print(f"[INFO] Prompt système chargé ({len(system_prompt)} chars)")
+    # Charger le prompt depuis Google Doc via GAS (inutile pour le scoreur local)
+    if offline:
+        system_prompt = ""
+    else:
+        system_prompt = fetch_prompt(args.gas_url, args.doc_id, cache_dir=args.gas_cache_dir)
+        print(f"[INFO] Prompt système chargé ({len(system_prompt)} chars)")
 
     # Unzip only
     mp3_files = unzip_mp3s(args.zip_path)
@@ -339,6 +412,8 @@ def main():
             batch_size=args.batch_size,
             align_cache=align_cache,
             align_model_name=args.align_model,
+            chunk_sec=args.chunk_sec,
+            chunk_workers=args.chunk_workers,
         )
         words = aligned.get("word_segments", [])
         if not words:
@@ -361,13 +436,50 @@ def main():
 
     print(f"[INFO] Segments générés: {len(all_segments)}")
 
-    # Score with GPT in batches
-    scored = score_all_segments_with_gpt(all_segments, args.openai_model, system_prompt)
-
+    # Score with GPT in batches (ou scoreur local / hybride)
+    score_stats: List[Dict[str, Any]] = []
     keep_ratio = max(0.0, min(1.0, args.keep_pct / 100.0))
+    if args.score_benchmark:
+        legacy_stats: List[Dict[str, Any]] = []
+        t0 = time.time()
+        score_all_segments_with_gpt(all_segments, args.openai_model, system_prompt, protocol="legacy", stats=legacy_stats)
+        print(f"[BENCH] {format_score_stats('legacy', legacy_stats)}  (total {time.time() - t0:.1f}s)")
+    gpt_kwargs = {"model": args.openai_model, "system_prompt": system_prompt,
+                  "protocol": args.score_protocol, "stats": score_stats}
+    t0 = time.time()
+    if args.scorer == "gpt":
+        scored = score_all_segments_with_gpt(all_segments, **gpt_kwargs)
+    else:
+        scored = score_segments_local(all_segments, local_model, keep_frac=keep_ratio,
+                                      hybrid=(args.scorer == "hybrid"), gpt_kwargs=gpt_kwargs,
+                                      hybrid_max_frac=max(0.0, min(1.0, args.hybrid_max_pct / 100.0)))
+    score_wall = time.time() - t0
+
+    # Couples (texte, score GPT) conservés pour ré-entraîner le scoreur local
+    if args.score_store:
+        n = append_score_store(args.score_store, [
+            {"text": s["text"], "score": s["score"], "model": args.openai_model, "zip": Path(args.zip_path).name}
+            for s in scored if s.get("source") == "gpt"
+        ])
+        if n:
+            print(f"[INFO] {n} scores GPT ajoutés à {args.score_store}")
+
     target_seconds = total_input * keep_ratio
     chosen = select_segments_to_target(scored, target_seconds)
 
+    # Labels uniquement pour les clips retenus (protocole compact)
+    if args.score_protocol == "compact" and args.scorer != "local" and chosen:
+        t0 = time.time()
+        labels = openai_label_segments(chosen, args.openai_model, system_prompt, stats=score_stats)
+        for c in chosen:
+            c["label"] = labels.get(c["i"], "")
+        score_wall += time.time() - t0
+    if args.scorer == "local":
+        print(f"[INFO] Scoreur local: {score_wall:.3f}s, aucun appel GPT")
+    else:
+        print(f"[{'BENCH' if args.score_benchmark else 'INFO'}] {format_score_stats(args.score_protocol, score_stats)}  "
+              f"(total {score_wall:.1f}s)")
+
     # Save chosen clips (file + local timestamps)
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -379,19 +491,19 @@ def main():
         ]}, f, ensure_ascii=False, indent=2)
 
     # Cut and concat with ffmpeg (streamed)
-    bestof_mp3 = str(out_dir / "bestof.mp3")
+    bestof_path = str(out_dir / f"bestof{get_codec(args.codec)['ext']}")
     if chosen:
-        cut_and_concat_with_ffmpeg(chosen, bestof_mp3)
-        # Compute resulting duration quickly
-        try:
-            bo_dur = AudioSegment.from_file(bestof_mp3, format="mp3").duration_seconds
-        except Exception:
-            # fallback if pydub probing fails
-            bo_dur = sum((c["end"] - c["start"]) for c in chosen)
+        stats = cut_and_concat_with_ffmpeg(
+            chosen, bestof_path, codec=args.codec,
+            compare_dir=str(out_dir / "codec_compare") if args.compare_codecs else None,
+        )
+        bo_dur = stats["duration"] or sum((c["end"] - c["start"]) for c in chosen)
+        # Index des chapitres: offset best-of -> fichier source / start / label
+        write_chapters_sidecar(build_chapters(chosen), bestof_path, args.codec, str(out_dir / "chapters.json"))
     else:
         bo_dur = 0.0
 
-    print(f"=== Résultat ===\nBest-of : {bestof_mp3} ({human_time(bo_dur)})")
+    print(f"=== Résultat ===\nBest-of : {bestof_path} ({human_time(bo_dur)})")
 
 if __name__ == "__main__":
     main()